@@ -0,0 +1,83 @@
+##########################################
+# Enhanced TRACE Data Process            #
+# Monthly trade-level illiquidity and    #
+# transaction-cost measures              #
+# Alexander Dickerson                    #
+# Email: a.dickerson@warwick.ac.uk       #
+##########################################
+
+'''
+Overview
+-------------
+This Python script aggregates the daily trade-level measures written by
+"MakeIntra_Daily_v2.py" (the Measures output) to months:
+
+    espread    effective spread (% of price), mean over the days
+    irc        imputed roundtrip cost (%), mean over the roundtrips
+    n_irt      number of imputed roundtrip trades
+    gamma      -cov of consecutive intraday log returns (pooled within
+               the days of the month)
+    roll       2 * sqrt(gamma)
+    n_roll     number of intraday return pairs
+    prc_range  intraday price range (%), mean over the days
+    ndays      number of days with a trade
+
+The daily measures are computed from the cleaned trades in the cleaning
+pass; see trace_utils/measures.py for their definitions. Unlike the Bao
+et al. (2011) ILLIQ of "MakeIlliquidity.py", which uses daily closes,
+gamma and roll here use the returns between consecutive trades within
+each day.
+
+Requirements
+-------------
+Data output from "MakeIntra_Daily_v2.py" including
+    (1) Measures.csv.gzip (or Measures.parquet with OUTPUT_FORMAT = 'parquet')
+
+Package versions
+-------------
+pandas v1.4.4
+numpy v1.21.5
+pyarrow
+'''
+
+#* ************************************** */
+#* Libraries                              */
+#* ************************************** */
+import pandas as pd
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.dataset import read_daily
+from trace_utils.measures import monthly_measures
+
+#* ************************************** */
+#* Load the daily measures                */
+#* ************************************** */
+# The OUTPUT_FORMAT MakeIntra_Daily_v2.py was run with: 'csv' (default) for
+# Measures.csv.gzip, 'parquet' for the Measures.parquet dataset
+OUTPUT_FORMAT = 'csv'
+MEASURES_FILE = 'Measures' + ('.parquet' if OUTPUT_FORMAT == 'parquet'
+                              else '.csv.gzip')
+
+if MEASURES_FILE.endswith('.parquet'):
+    daily = read_daily(MEASURES_FILE)
+else:
+    daily = pd.read_csv(MEASURES_FILE,
+                        compression = 'gzip',
+                        index_col   = ['cusip_id', 'trd_exctn_dt'],
+                        parse_dates = ['trd_exctn_dt'])
+
+#* ************************************** */
+#* Aggregate to months                    */
+#* ************************************** */
+# Bonds can be restricted to months with enough roundtrips / return
+# pairs afterwards, e.g. n_roll >= 5 as for the monthly ILLIQ.
+monthly = monthly_measures(daily).reset_index()
+monthly = monthly.rename(columns = {'cusip_id': 'cusip'})
+
+print(monthly.describe().round(3))
+
+monthly.to_csv('bond_trade_measures_monthly.csv.gzip',
+               index       = False,
+               compression = 'gzip')
+# =============================================================================
@@ -0,0 +1,80 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.antijoin import anti_join_mask
+
+POST_KEYS = ['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm', 'rptd_pr',
+             'entrd_vol_qt', 'rpt_side_cd', 'cntra_mp_id']
+
+
+def baseline_filter(left, right, left_on, right_on):
+    # Steps 1.1 / 1.2 of the original MakeBondIntra_Daily.py /
+    # CleanTRACEIntraday.py: left-merge the trade records with the X / C
+    # (or Y) records and keep the rows with no match
+    merged = pd.merge(left, right[right_on + ['trc_st']],
+                      left_on=left_on, right_on=right_on, how='left')
+    merged = merged[merged['trc_st_y'].isnull()]
+    return merged.rename(columns=lambda c: c[:-2] if c.endswith('_x')
+                         else c)[left.columns]
+
+
+def random_post(n, seed):
+    # Post 2012-02-06 records drawn from small key domains, so that most X,
+    # C and Y records match a trade, some match several and some none
+    rng  = np.random.default_rng(seed)
+    post = pd.DataFrame({
+        'cusip_id'       : rng.choice(['00000AAA1', '00000BBB2'], n),
+        'trd_exctn_dt'   : pd.Timestamp('2015-03-02') +
+                           pd.to_timedelta(rng.integers(0, 3, n), unit='D'),
+        'trd_exctn_tm'   : rng.choice(['10:00:00', '10:00:01'], n),
+        'rptd_pr'        : rng.choice([99.5, 100.0], n),
+        'entrd_vol_qt'   : rng.choice([10000.0, 50000.0], n),
+        'rpt_side_cd'    : rng.choice(['B', 'S'], n),
+        'cntra_mp_id'    : rng.choice(['C', 'D', None], n),
+        'msg_seq_nb'     : rng.integers(1, 40, n),
+        'orig_msg_seq_nb': rng.integers(1, 40, n).astype(float),
+        'trc_st'         : rng.choice(['T', 'R', 'X', 'C', 'Y'], n,
+                                      p=[0.5, 0.1, 0.15, 0.1, 0.15])})
+    post.loc[post['trc_st'].isin(['T', 'R', 'X', 'C']),
+             'orig_msg_seq_nb'] = np.nan
+    return post
+
+
+def test_cancellations_and_corrections_as_baseline():
+    post    = random_post(4000, seed=3)
+    post_tr = post[post['trc_st'].isin(['T', 'R'])].drop_duplicates()
+    post_xc = post[post['trc_st'].isin(['X', 'C'])]
+    keys    = POST_KEYS + ['msg_seq_nb']
+
+    kept     = post_tr[anti_join_mask(post_tr, post_xc, keys)]
+    expected = baseline_filter(post_tr, post_xc, keys, keys)
+    assert 0 < len(kept) < len(post_tr)
+    pd.testing.assert_frame_equal(kept, expected.set_axis(kept.index))
+
+
+def test_reversals_as_baseline_merge():
+    # The Y records match on orig_msg_seq_nb; the baseline merge is the
+    # step 1.2 merge, filtered on its own match column (see CHANGELOG.md)
+    post    = random_post(4000, seed=5)
+    post_tr = post[post['trc_st'].isin(['T', 'R'])].drop_duplicates()
+    post_y  = post[post['trc_st'] == 'Y']
+
+    kept     = post_tr[anti_join_mask(post_tr, post_y,
+                                      POST_KEYS + ['msg_seq_nb'],
+                                      POST_KEYS + ['orig_msg_seq_nb'])]
+    expected = baseline_filter(post_tr, post_y,
+                               POST_KEYS + ['msg_seq_nb'],
+                               POST_KEYS + ['orig_msg_seq_nb'])
+    assert 0 < len(kept) < len(post_tr)
+    pd.testing.assert_frame_equal(kept, expected.set_axis(kept.index))
+
+
+def test_missing_keys_match():
+    left  = pd.DataFrame({'a': ['x', None, 'y'], 'b': [1, 2, 3]})
+    right = pd.DataFrame({'a': [None, 'y'], 'b': [2, 4]})
+    assert anti_join_mask(left, right, ['a', 'b']).tolist() == \
+        [True, False, True]
@@ -0,0 +1,85 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.bonds import bond_vars, BOND_COLUMNS
+
+# Bounds of yields.py: QuantLib solves the yields to 1e-8, and the prices,
+# duration and convexity agree to 1e-12 relative
+YIELD_TOLERANCE    = 1e-8
+RELATIVE_TOLERANCE = 1e-12
+
+
+def random_bond_days(n_bonds, n_days, seed):
+    # Plain fixed rate bonds with all the day count bases and coupon
+    # frequencies, half of them maturing at a month end, with a dated date
+    # off the coupon cycle (a short first coupon), traded on random days of
+    # 2015 - 2024 (three leap years)
+    rng  = np.random.default_rng(seed)
+    rows = []
+    for b in range(n_bonds):
+        month = pd.Timestamp(int(rng.integers(2018, 2045)),
+                             int(rng.integers(1, 13)), 1)
+        if rng.random() < 0.5:
+            maturity = month + pd.offsets.MonthEnd(0)
+        else:
+            maturity = month + pd.Timedelta(days=int(rng.integers(0, 28)))
+        dated = maturity - pd.DateOffset(years=int(rng.integers(3, 31))) \
+            + pd.Timedelta(days=int(rng.integers(0, 120)))
+        terms = {'cusip_id'          : 'C%08d' % b,
+                 'offering_date'     : dated,
+                 'dated_date'        : dated,
+                 'coupon'            : round(rng.uniform(0.5, 9), 3),
+                 'coupon_type'       : 'F',
+                 'maturity'          : maturity,
+                 'day_count_basis'   : rng.choice(['30/360', 'ACT/ACT',
+                                                   'ACT/360', 'ACT/365']),
+                 'interest_frequency': rng.choice(['1', '2', '4', '12'])}
+        days = pd.Timestamp('2015-01-01') + pd.to_timedelta(
+            np.sort(rng.integers(0, 3650, n_days)), unit='D')
+        for day in days:
+            rows.append(dict(terms, trd_exctn_dt=day,
+                             pr=rng.uniform(60, 140), qvolume=100000.0,
+                             dvolume=100000.0))
+    return pd.DataFrame(rows)[BOND_COLUMNS]
+
+
+@pytest.fixture(scope='module')
+def bond_days():
+    rows = random_bond_days(150, 20, seed=1)
+    last = rows['maturity'] == rows['maturity'] + pd.offsets.MonthEnd(0)
+    leap = rows['trd_exctn_dt'].dt.is_leap_year & \
+        (rows['day_count_basis'] == 'ACT/ACT')
+    short = rows['dated_date'].dt.day != rows['maturity'].dt.day
+    assert last.any() and (~last).any() and leap.any() and short.any()
+    return rows
+
+
+def test_accrued_interest_as_quantlib(bond_days):
+    # cashflows.py follows QuantLib's arithmetic: the amounts are the same
+    # to the bit
+    fast = bond_vars(bond_days, engine='numpy')
+    ref  = bond_vars(bond_days, engine='quantlib')
+    assert fast['acclast'].notna().sum() > 0.8 * len(bond_days)
+    for col in ['sttldt', 'acclast', 'accpmt', 'accall']:
+        pd.testing.assert_series_equal(fast[col], ref[col], check_exact=True)
+
+
+@pytest.mark.parametrize('true_yield', [False, True])
+def test_yields_as_quantlib(bond_days, true_yield):
+    fast = bond_vars(bond_days, true_yield=true_yield, engine='numpy')
+    ref  = bond_vars(bond_days, true_yield=true_yield, engine='quantlib')
+    assert fast['ytm'].notna().sum() > 0.8 * len(bond_days)
+
+    yields = ['ytm', 'ytmt'] if true_yield else ['ytm']
+    for col in yields + ['prclean', 'prfull', 'mod_dur', 'convexity']:
+        assert (fast[col].isna() == ref[col].isna()).all(), col
+        tol = YIELD_TOLERANCE if col in yields else RELATIVE_TOLERANCE
+        np.testing.assert_allclose(fast[col], ref[col],
+                                   rtol=0 if col in yields else tol,
+                                   atol=tol if col in yields else 0,
+                                   err_msg=col)
@@ -0,0 +1,21 @@
+import datetime as dt
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.checkpoint import ChunkStore
+
+
+def test_key_changes_with_the_data_vintage(tmp_path):
+    cusips = ['00000AAA1', '00000BBB2']
+    old    = ChunkStore(str(tmp_path), config='filters',
+                        vintage=dt.date(2023, 3, 31))
+    old.save(old.key(cusips), None, {'Obs.Pre': 0})
+
+    # Same data: the chunk is done; newer records in TRACE: it is not
+    same  = ChunkStore(str(tmp_path), config='filters',
+                       vintage=dt.date(2023, 3, 31))
+    newer = ChunkStore(str(tmp_path), config='filters',
+                       vintage=dt.date(2023, 6, 30))
+    assert same.done(same.key(cusips[::-1]))
+    assert not newer.done(newer.key(cusips))
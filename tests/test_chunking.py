@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.chunking import trade_counts
+
+
+class CountingSource:
+    '''Stand-in for source.count, with a trade count that can grow.'''
+
+    def __init__(self, n_trades):
+        self.n_trades = n_trades
+        self.calls    = 0
+
+    def count(self, cusips):
+        self.calls += 1
+        return pd.Series(self.n_trades, index=list(cusips), name='n_trades')
+
+
+def test_cache_is_rebuilt_when_stale(tmp_path):
+    cache  = str(tmp_path / 'trade_counts.csv')
+    source = CountingSource(10)
+    assert trade_counts(source, ['A', 'B'], cache=cache).tolist() == [10, 10]
+
+    # Fresh cache: only the new CUSIP is counted, and the age is kept
+    week_ago = time.time() - 6 * 86400
+    os.utime(cache, (week_ago, week_ago))
+    source.n_trades = 20
+    assert trade_counts(source, ['A', 'B', 'C'], cache=cache).tolist() == \
+        [10, 10, 20]
+    assert abs(os.path.getmtime(cache) - week_ago) < 1
+
+    # Stale cache: every CUSIP is counted again
+    stale = time.time() - 8 * 86400
+    os.utime(cache, (stale, stale))
+    assert trade_counts(source, ['A', 'B', 'C'], cache=cache).tolist() == \
+        [20, 20, 20]
+    assert trade_counts(source, ['A'], cache=cache, ttl_days=None).tolist() \
+        == [20]
+    assert source.calls == 3
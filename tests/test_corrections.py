@@ -0,0 +1,165 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.corrections import resolve_w_chains
+
+KEYS = ['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm', 'msg_seq_nb',
+        'orig_msg_seq_nb']
+
+
+def baseline_w_clean(pre_w):
+    # Steps 2.2.1 - 2.2.6 of the original MakeBondIntra_Daily.py /
+    # CleanTRACEIntraday.py, as they were before trace_utils/corrections.py
+    w_msg = pre_w[['cusip_id', 'bond_sym_id', 'trd_exctn_dt', 'trd_exctn_tm', 'msg_seq_nb']].copy()
+    w_msg['flag'] = 'msg'
+    w_omsg = pre_w[['cusip_id', 'bond_sym_id', 'trd_exctn_dt', 'trd_exctn_tm', 'orig_msg_seq_nb']]
+    w_omsg = w_omsg.rename(columns={'orig_msg_seq_nb': 'msg_seq_nb'})
+    w_omsg['flag'] = 'omsg'
+    w = pd.concat([w_omsg, w_msg])
+
+    w_napp = w.groupby(['cusip_id', 'bond_sym_id', 'trd_exctn_dt',
+                        'trd_exctn_tm', 'msg_seq_nb']).size().reset_index(name='napp')
+    w_mult = w.drop_duplicates(subset=['cusip_id', 'bond_sym_id',
+                                       'trd_exctn_dt', 'trd_exctn_tm',
+                                       'msg_seq_nb', 'flag'])
+    w_mult1 = w_mult.groupby(['cusip_id', 'bond_sym_id', 'trd_exctn_dt',
+                              'trd_exctn_tm', 'msg_seq_nb']).size().reset_index(name='ntype')
+    w_comb = pd.merge(w_napp, w_mult1, on=['cusip_id', 'bond_sym_id',
+                                           'trd_exctn_dt', 'trd_exctn_tm',
+                                           'msg_seq_nb'],
+                      how='left').sort_values(by=['cusip_id', 'trd_exctn_dt',
+                                                  'trd_exctn_tm'])
+    __w_keep = pd.merge(w_comb[(w_comb['napp'] == 1) | ((w_comb['napp'] > 1) & (w_comb['ntype'] == 1))],
+                        w,
+                        on=['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm', 'msg_seq_nb'],
+                        how='inner',
+                        suffixes=('', '_DROP')).filter(regex='^(?!.*_DROP)').sort_values(
+                            by=['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm'])
+
+    __w_keep['npair'] = __w_keep.drop_duplicates().groupby(by=[
+        'cusip_id', 'trd_exctn_dt', 'trd_exctn_tm'])['cusip_id'].transform('count') / 2
+    __w_keep = __w_keep.sort_values(by=['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm'])
+
+    __w_keep1 = __w_keep[__w_keep['npair'] == 1].pivot(index=['cusip_id',
+                                                              'trd_exctn_dt',
+                                                              'trd_exctn_tm'],
+                                                       columns='flag',
+                                                       values='msg_seq_nb')
+    __w_keep1.reset_index(inplace=True)
+    __w_keep1.rename(columns={'msg': 'msg_seq_nb', 'omsg': 'orig_msg_seq_nb'}, inplace=True)
+
+    __w_keep2 = pd.merge(__w_keep[(__w_keep['flag'] == 'msg') & (__w_keep['npair'] > 1)], pre_w,
+                         left_on=['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm', 'msg_seq_nb'],
+                         right_on=['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm', 'msg_seq_nb'],
+                         how='left',
+                         suffixes=('', '_DROP')).filter(regex='^(?!.*_DROP)')
+    __w_keep2 = __w_keep2[['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm',
+                           'msg_seq_nb', 'orig_msg_seq_nb']].drop_duplicates()
+
+    __w_clean = pd.concat([__w_keep1, __w_keep2], axis=0)
+    w_clean = pd.merge(__w_clean, pre_w.drop(columns=['orig_msg_seq_nb']),
+                       left_on=['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm', 'msg_seq_nb'],
+                       right_on=['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm', 'msg_seq_nb'],
+                       how='left').drop_duplicates(subset=['orig_msg_seq_nb',
+                                                           'cusip_id',
+                                                           'trd_exctn_dt',
+                                                           'trd_exctn_tm',
+                                                           'msg_seq_nb'])
+    return w_clean
+
+
+def w_records(rows):
+    '''W records from (cusip_id, trd_exctn_tm, msg_seq_nb, orig_msg_seq_nb).'''
+    frame = pd.DataFrame(rows, columns=['cusip_id', 'trd_exctn_tm',
+                                        'msg_seq_nb', 'orig_msg_seq_nb'])
+    frame.insert(1, 'bond_sym_id', frame['cusip_id'] + '.GA')
+    frame.insert(2, 'trd_exctn_dt', pd.Timestamp('2005-02-04'))
+    frame['trc_st']       = 'W'
+    frame['rptd_pr']      = 100.0 + frame['msg_seq_nb'] / 100
+    frame['entrd_vol_qt'] = 50000.0
+    return frame
+
+
+def pairs(w_clean):
+    w_clean = w_clean[KEYS].astype({'msg_seq_nb'     : 'int64',
+                                    'orig_msg_seq_nb': 'int64'})
+    return set(map(tuple, w_clean.astype(str).to_numpy()))
+
+
+def random_chains(n_chains, seed):
+    # Correction chains T <- W <- W ... of 1 to 4 W records, one chain per
+    # execution time, and some T records corrected by two W records
+    rng  = np.random.default_rng(seed)
+    rows = []
+    seq  = 0
+    for k in range(n_chains):
+        cusip = 'C%08d' % rng.integers(0, n_chains // 10 + 1)
+        tm    = '%02d:%02d:%02d' % (9 + k // 3600, k // 60 % 60, k % 60)
+        root  = orig = seq = seq + 10
+        steps = rng.integers(1, 5)
+        for _ in range(steps):
+            seq += 1
+            rows.append((cusip, tm, seq, orig))
+            orig = seq
+        if steps == 1 and rng.random() < 0.3:
+            seq += 1
+            rows.append((cusip, tm, seq, root))
+    return w_records(rows)
+
+
+def test_same_as_baseline_on_chains_within_a_time_stamp():
+    pre_w = random_chains(2000, seed=11)
+    assert len(pre_w) > 4000
+    assert pairs(resolve_w_chains(pre_w)) == pairs(baseline_w_clean(pre_w))
+
+
+def test_multi_step_chains():
+    pre_w = w_records([('A', '10:00:00', 2, 1),     # T 1 <- W 2 <- W 3
+                       ('A', '10:00:00', 3, 2),
+                       ('B', '11:00:00', 12, 11),   # T 11 <- ... <- W 15
+                       ('B', '11:00:00', 13, 12),
+                       ('B', '11:00:00', 14, 13),
+                       ('B', '11:00:00', 15, 14),
+                       ('C', '12:00:00', 22, 21),   # single correction
+                       ('D', '13:00:00', 32, 31),   # two W for one T
+                       ('D', '13:00:00', 33, 31)])
+    expected = {('A', '2005-02-04', '10:00:00', '3', '1'),
+                ('B', '2005-02-04', '11:00:00', '15', '11'),
+                ('C', '2005-02-04', '12:00:00', '22', '21'),
+                ('D', '2005-02-04', '13:00:00', '32', '31'),
+                ('D', '2005-02-04', '13:00:00', '33', '31')}
+    assert pairs(resolve_w_chains(pre_w)) == expected
+    assert pairs(baseline_w_clean(pre_w)) == expected
+
+
+def test_chain_across_execution_times():
+    # Intended difference: a W that also corrects the execution time. The
+    # baseline paired records within one trd_exctn_tm, so W 3 kept orig 2
+    # (a W, never matched to a T in step 2.2.7) and the stale W 2 replaced
+    # T 1; the resolver follows the chain to T 1.
+    pre_w = w_records([('A', '10:00:00', 2, 1),
+                       ('A', '10:05:00', 3, 2)])
+    assert pairs(resolve_w_chains(pre_w)) == \
+        {('A', '2005-02-04', '10:05:00', '3', '1')}
+    assert pairs(baseline_w_clean(pre_w)) == \
+        {('A', '2005-02-04', '10:00:00', '2', '1'),
+         ('A', '2005-02-04', '10:05:00', '3', '2')}
+
+
+def test_several_chains_at_one_time_stamp():
+    # Intended difference: with more than one chain at a time stamp the
+    # baseline kept a single hop (W 3 with orig 2), so T 1 was never
+    # replaced; the resolver keeps W 3 with the root T 1.
+    pre_w = w_records([('A', '10:00:00', 2, 1),
+                       ('A', '10:00:00', 3, 2),
+                       ('A', '10:00:00', 6, 5)])
+    assert pairs(resolve_w_chains(pre_w)) == \
+        {('A', '2005-02-04', '10:00:00', '3', '1'),
+         ('A', '2005-02-04', '10:00:00', '6', '5')}
+    assert pairs(baseline_w_clean(pre_w)) == \
+        {('A', '2005-02-04', '10:00:00', '3', '2'),
+         ('A', '2005-02-04', '10:00:00', '6', '5')}
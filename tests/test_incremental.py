@@ -0,0 +1,113 @@
+import datetime as dt
+import os
+import sys
+from functools import partial
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.source import ParquetTraceSource, write_trace_parquet
+from trace_utils.cleaning import clean_chunk
+from trace_utils.filters import PRE2012_FILTERS
+from trace_utils.incremental import update_daily, report_watermark, INDEX
+
+
+def trade(cusip, day, seq, price, volume, reported=None):
+    return {'cusip_id'       : cusip,
+            'bond_sym_id'    : 'ABC.GA',
+            'trd_exctn_dt'   : day,
+            'trd_exctn_tm'   : '10:00:00',
+            'days_to_sttl_ct': '002',
+            'lckd_in_ind'    : None,
+            'wis_fl'         : 'N',
+            'sale_cndtn_cd'  : '@',
+            'msg_seq_nb'     : seq,
+            'trc_st'         : 'T',
+            'trd_rpt_dt'     : reported or day,
+            'trd_rpt_tm'     : '10:00:05',
+            'entrd_vol_qt'   : volume,
+            'rptd_pr'        : price,
+            'yld_pt'         : 5.0,
+            'asof_cd'        : None,
+            'orig_msg_seq_nb': None,
+            'rpt_side_cd'    : 'S',
+            'cntra_mp_id'    : 'C'}
+
+
+def write_mirror(trades, path):
+    write_trace_parquet(pd.DataFrame(trades).astype(
+        {'lckd_in_ind'    : 'string',
+         'asof_cd'        : 'string',
+         'orig_msg_seq_nb': 'float'}), path)
+
+
+def write_outputs(daily, path):
+    files = {}
+    for name, frame in daily.items():
+        files[name] = str(path / (name + '.csv.gzip'))
+        frame.to_csv(files[name], compression='gzip')
+    return files
+
+
+def test_update_with_a_single_new_trade(tmp_path):
+    old_day = dt.date(2023, 6, 1)
+    new_day = dt.date(2023, 6, 8)
+
+    # Mirror holding last week's trade and the single new one
+    mirror = str(tmp_path / 'trace')
+    write_mirror([trade('00000AAA1', old_day, 1, 99.5, 50000),
+                  trade('00000AAA1', new_day, 2, 100.25, 20000)], mirror)
+    source = ParquetTraceSource(mirror)
+
+    # Outputs of the previous run, which only saw last week's trade
+    clean = partial(clean_chunk, filters=PRE2012_FILTERS)
+    daily, _ = clean(source.fetch(['00000AAA1'], end=old_day), min_rows=0)
+    files    = write_outputs(daily, tmp_path)
+
+    stats = update_daily(source, ['00000AAA1'], new_day, clean, files,
+                         filters=PRE2012_FILTERS)
+    assert stats['Obs.Pre'].tolist() == [1]
+
+    prices = pd.read_csv(files['Prices'], compression='gzip',
+                         index_col=INDEX, parse_dates=['trd_exctn_dt'])
+    assert prices.index.tolist() == \
+        [('00000AAA1', pd.Timestamp(old_day)),
+         ('00000AAA1', pd.Timestamp(new_day))]
+    assert prices.loc[('00000AAA1', pd.Timestamp(new_day)), 'prc_vw'] == \
+        100.25
+
+    volumes = pd.read_csv(files['Volumes'], compression='gzip',
+                          index_col=INDEX, parse_dates=['trd_exctn_dt'])
+    assert volumes.loc[('00000AAA1', pd.Timestamp(new_day)), 'qvolume'] == \
+        20000
+
+
+def test_update_after_a_backfilled_record(tmp_path):
+    # TRACE lags the calendar: the last run (in June) only saw records
+    # reported up to the end of March
+    mirror = str(tmp_path / 'trace')
+    write_mirror([trade('00000AAA1', dt.date(2023, 3, 1), 1, 99.5, 50000),
+                  trade('00000AAA1', dt.date(2023, 3, 31), 2, 99.75,
+                        50000)], mirror)
+    source    = ParquetTraceSource(mirror)
+    watermark = report_watermark(source)
+    assert watermark == dt.date(2023, 3, 31)
+
+    clean    = partial(clean_chunk, filters=PRE2012_FILTERS)
+    daily, _ = clean(source.fetch(['00000AAA1']), min_rows=0)
+    files    = write_outputs(daily, tmp_path)
+
+    # A record reported before the watermark is loaded after that run
+    backfill = dt.date(2023, 3, 20)
+    write_mirror([trade('00000AAA1', backfill, 3, 100.5, 20000,
+                        reported=dt.date(2023, 3, 24))], mirror)
+    source = ParquetTraceSource(mirror)
+    assert report_watermark(source, watermark) == watermark
+
+    update_daily(source, ['00000AAA1'], watermark - dt.timedelta(days=30),
+                 clean, files, filters=PRE2012_FILTERS)
+    prices = pd.read_csv(files['Prices'], compression='gzip',
+                         index_col=INDEX, parse_dates=['trd_exctn_dt'])
+    assert prices.loc[('00000AAA1', pd.Timestamp(backfill)), 'prc_vw'] == \
+        100.5
+    assert len(prices) == 3
@@ -0,0 +1,104 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.reversals import reversal_drop_mask, REV_KEYS
+
+HEADER = ['cusip_id', 'bond_sym_id', 'trd_exctn_dt', 'trd_exctn_tm',
+          'entrd_vol_qt', 'rptd_pr', 'rpt_side_cd', 'cntra_mp_id',
+          'trd_rpt_dt', 'trd_rpt_tm', 'msg_seq_nb']
+
+
+def baseline_reversals(clean_pre3):
+    # Step 2.3 of the original MakeBondIntra_Daily.py /
+    # CleanTRACEIntraday.py: number the reversals and the trades within the
+    # 6 keys and bond_sym_id, match the k-th reversal to the k-th trade
+    rev = clean_pre3[clean_pre3['asof_cd'] == 'R'][HEADER[:-1]]
+    rev = rev.sort_values(by=['cusip_id', 'bond_sym_id', 'trd_exctn_dt',
+                              'entrd_vol_qt', 'rptd_pr', 'rpt_side_cd',
+                              'cntra_mp_id', 'trd_exctn_tm', 'trd_rpt_dt',
+                              'trd_rpt_tm'])
+    rev['seq'] = rev.groupby(['cusip_id', 'bond_sym_id'] + REV_KEYS[1:]) \
+        .cumcount() + 1
+
+    pre4   = clean_pre3[~clean_pre3['asof_cd'].isin(['R', 'X', 'D'])]
+    header = pre4[HEADER].sort_values(
+        by=['cusip_id', 'bond_sym_id', 'trd_exctn_dt', 'entrd_vol_qt',
+            'rptd_pr', 'rpt_side_cd', 'cntra_mp_id', 'trd_exctn_tm',
+            'trd_rpt_dt', 'trd_rpt_tm', 'msg_seq_nb'])
+    header['seq6'] = header.groupby(['cusip_id', 'bond_sym_id'] +
+                                    REV_KEYS[1:]).cumcount() + 1
+
+    header = pd.merge(header.drop_duplicates(), rev,
+                      left_on=REV_KEYS + ['seq6'], right_on=REV_KEYS + ['seq'],
+                      how='left', suffixes=('', '_DROP')) \
+        .filter(regex='^(?!.*_DROP)').drop_duplicates()
+    header = header[header['seq'].isna()].drop(columns=['seq', 'seq6'])
+
+    keep = [c for c in HEADER if c != 'bond_sym_id']
+    pre5 = pre4.merge(header, on=keep, how='inner',
+                      suffixes=('', '_DROP')).filter(regex='^(?!.*_DROP)')
+    return pre5.drop_duplicates()
+
+
+def random_pre(n, seed):
+    # Pre 2012-02-06 records drawn from small key domains, with repeated
+    # trades on the 6 keys, identical records and several reversals
+    rng = np.random.default_rng(seed)
+    pre = pd.DataFrame({
+        'cusip_id'    : rng.choice(['00000AAA1', '00000BBB2'], n),
+        'bond_sym_id' : 'ABC.GA',
+        'trd_exctn_dt': pd.Timestamp('2005-02-04') +
+                        pd.to_timedelta(rng.integers(0, 2, n), unit='D'),
+        'trd_exctn_tm': rng.choice(['10:00:00', '10:30:00', '11:00:00'], n),
+        'entrd_vol_qt': rng.choice([10000.0, 50000.0], n),
+        'rptd_pr'     : rng.choice([99.5, 100.0], n),
+        'rpt_side_cd' : rng.choice(['B', 'S'], n),
+        'cntra_mp_id' : rng.choice(['C', 'D'], n),
+        'trd_rpt_dt'  : pd.Timestamp('2005-02-04') +
+                        pd.to_timedelta(rng.integers(0, 3, n), unit='D'),
+        'trd_rpt_tm'  : rng.choice(['12:00:00', '13:00:00'], n),
+        'msg_seq_nb'  : rng.integers(1, 6, n),
+        'asof_cd'     : rng.choice(['', 'R', 'A', 'X', 'D'], n,
+                                   p=[0.6, 0.2, 0.1, 0.05, 0.05])})
+    return pd.concat([pre, pre.sample(n // 10, random_state=seed)],
+                     ignore_index=True)
+
+
+def test_same_as_baseline():
+    clean_pre3 = random_pre(3000, seed=7)
+    pre4       = clean_pre3[~clean_pre3['asof_cd'].isin(['R', 'X', 'D'])]
+    drop       = reversal_drop_mask(pre4,
+                                    clean_pre3[clean_pre3['asof_cd'] == 'R'])
+    assert 0 < drop.sum() < len(pre4)
+
+    kept     = pre4[~drop].drop_duplicates()
+    expected = baseline_reversals(clean_pre3)[kept.columns]
+    order    = list(kept.columns)
+    pd.testing.assert_frame_equal(
+        kept.sort_values(order).reset_index(drop=True),
+        expected.sort_values(order).reset_index(drop=True))
+
+
+def test_kth_reversal_cancels_kth_trade():
+    # Three trades on the same 6 keys, two reversals: the first two trades
+    # by execution time are cancelled
+    trades = pd.DataFrame({'cusip_id'    : 'A',
+                           'bond_sym_id' : 'A.GA',
+                           'trd_exctn_dt': pd.Timestamp('2005-02-04'),
+                           'trd_exctn_tm': ['11:00:00', '10:00:00',
+                                            '12:00:00'],
+                           'entrd_vol_qt': 10000.0,
+                           'rptd_pr'     : 100.0,
+                           'rpt_side_cd' : 'B',
+                           'cntra_mp_id' : 'D',
+                           'trd_rpt_dt'  : pd.Timestamp('2005-02-04'),
+                           'trd_rpt_tm'  : '13:00:00',
+                           'msg_seq_nb'  : [2, 1, 3],
+                           'asof_cd'     : ''})
+    reversals = trades.iloc[:2].assign(asof_cd='R', msg_seq_nb=[5, 6])
+    assert reversal_drop_mask(trades, reversals).tolist() == \
+        [True, True, False]
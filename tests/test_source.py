@@ -0,0 +1,78 @@
+import datetime as dt
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from trace_utils.source import (ParquetTraceSource, fetch_counted,
+                                write_trace_parquet)
+from trace_utils.cleaning import clean_chunk
+from trace_utils.filters import PRE2012_FILTERS, trade_mask_counts
+from trace_utils.audit import read_audit
+
+
+def trades(n):
+    # Pre-2012 trades of one bond, every third one below $10,000 and every
+    # fourth one when-issued
+    day = dt.date(2005, 2, 4)
+    return pd.DataFrame({'cusip_id'       : '00000AAA1',
+                         'bond_sym_id'    : 'ABC.GA',
+                         'trd_exctn_dt'   : day,
+                         'trd_exctn_tm'   : ['10:%02d:%02d' % divmod(i, 60)
+                                             for i in range(n)],
+                         'days_to_sttl_ct': '002',
+                         'lckd_in_ind'    : pd.Series([None] * n,
+                                                      dtype='string'),
+                         'wis_fl'         : ['Y' if i % 4 == 0 else 'N'
+                                             for i in range(n)],
+                         'sale_cndtn_cd'  : '@',
+                         'msg_seq_nb'     : range(1, n + 1),
+                         'trc_st'         : 'T',
+                         'trd_rpt_dt'     : day,
+                         'trd_rpt_tm'     : '12:00:00',
+                         'entrd_vol_qt'   : [5000.0 if i % 3 == 0 else
+                                             50000.0 for i in range(n)],
+                         'rptd_pr'        : 100.0,
+                         'yld_pt'         : 5.0,
+                         'asof_cd'        : pd.Series([None] * n,
+                                                      dtype='string'),
+                         'orig_msg_seq_nb': float('nan'),
+                         'rpt_side_cd'    : 'S',
+                         'cntra_mp_id'    : 'C'})
+
+
+def test_pushed_down_filters_are_counted(tmp_path):
+    write_trace_parquet(trades(150), str(tmp_path / 'trace'))
+    source = ParquetTraceSource(str(tmp_path / 'trace'))
+
+    trace = fetch_counted(source, ['00000AAA1'], filters=PRE2012_FILTERS)
+    raw   = source.fetch(['00000AAA1'])
+    raw['trd_rpt_dt'] = pd.to_datetime(raw['trd_rpt_dt'])
+    keep, removed = trade_mask_counts(raw, PRE2012_FILTERS)
+    assert trace.attrs['fetch']['rows'] == 150
+    assert trace.attrs['fetch']['removed'] == removed
+    assert len(trace) == keep.sum() == 75
+
+    # The audit charges the pushed-down filters and times the fetch
+    log = str(tmp_path / 'audit.jsonl')
+    clean_chunk(trace, filters=PRE2012_FILTERS, audit=log)
+    audit = read_audit(log).iloc[0]
+    assert audit['rules.volume'] == 50
+    assert audit['rules.wis'] == 25
+    assert audit['stages.fetch.seconds'] >= 0
+
+
+def test_min_rows_on_the_raw_records(tmp_path):
+    # 150 raw records, 75 left after the filters: the chunk is cleaned with
+    # min_rows = 100 whether or not the filters are pushed down
+    write_trace_parquet(trades(150), str(tmp_path / 'trace'))
+    source = ParquetTraceSource(str(tmp_path / 'trace'))
+
+    for filters in [PRE2012_FILTERS, None]:
+        trace = fetch_counted(source, ['00000AAA1'], filters=filters)
+        daily, stats = clean_chunk(trace, filters=PRE2012_FILTERS,
+                                   min_rows=100)
+        assert stats['Obs.Pre'] == 150
+        assert stats['Obs.PostBBW'] == 75
+        assert daily is not None
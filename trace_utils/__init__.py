@@ -0,0 +1,7 @@
+'''
+Overview
+-------------
+Shared helpers for the TRACE processing scripts. The scripts in the TRACE,
+NOISE and enhanced_trace_cleaning folders add the repository root to
+sys.path and import from here, so each stage is written once.
+'''
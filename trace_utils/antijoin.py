@@ -0,0 +1,60 @@
+'''
+Overview
+-------------
+Composite-key anti-join used by the post 2012/02/06 Dick-Nielsen steps
+(1.1 cancellations / corrections and 1.2 reversals in cleaning.py). The
+steps used to left-merge the full trade records with the X / C / Y
+records on 8 keys and keep the rows with a null trc_st_y, which copies
+every column of the trade record into the merged frame.
+
+Here the key columns of both sides are hashed row-wise to one uint64 per
+record and the left rows whose hash appears on the right are the match
+candidates. Candidates are then verified on the actual key values, so a
+hash collision can never drop a trade. The result is a boolean keep-mask
+aligned with the left frame; only the key columns are ever copied.
+
+Missing key values match each other, as they did in pd.merge.
+'''
+
+import numpy as np
+import pandas as pd
+
+
+def key_hash(left, right, left_on, right_on):
+    '''
+    Row-wise uint64 hashes of left[left_on] and right[right_on].
+
+    Both sides are hashed from one frame, so columns with different dtypes
+    on each side (e.g. msg_seq_nb against orig_msg_seq_nb) are first cast
+    to their common dtype, as pd.merge compares them.
+    '''
+    keys = pd.concat([left[left_on],
+                      right[right_on].set_axis(left_on, axis=1)],
+                     ignore_index=True)
+    h = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    return keys, h[:len(left)], h[len(left):]
+
+
+def anti_join_mask(left, right, left_on, right_on=None):
+    '''
+    Boolean array, True for the rows of `left` with no row of `right`
+    matching on all the keys (left_on[i] against right_on[i]).
+    '''
+    right_on = left_on if right_on is None else right_on
+    if len(left) == 0 or len(right) == 0:
+        return np.ones(len(left), dtype=bool)
+
+    keys, lh, rh = key_hash(left, right, left_on, right_on)
+    cand = np.flatnonzero(pd.Index(rh).unique().get_indexer(lh) >= 0)
+    if len(cand) == 0:
+        return np.ones(len(left), dtype=bool)
+
+    # Verify the candidates on the key values (hash collisions)
+    rpos  = len(left) + np.flatnonzero(np.isin(rh, lh[cand]))
+    lkeys = keys.iloc[cand].assign(_pos=cand)
+    rkeys = keys.iloc[rpos].drop_duplicates()
+    hit   = lkeys.merge(rkeys, on=left_on, how='inner')['_pos'].to_numpy()
+
+    keep = np.ones(len(left), dtype=bool)
+    keep[hit] = False
+    return keep
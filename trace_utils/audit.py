@@ -0,0 +1,181 @@
+'''
+Overview
+-------------
+Per-chunk cleaning audit. While a chunk is cleaned, ChunkAudit.mark closes
+each stage of the cleaning with
+
+    (1) the rows removed by every rule of the stage,
+    (2) the wall time of the stage, and
+    (3) the peak RSS of the process at the end of the stage,
+
+and one JSON record per chunk is appended to the audit log (JSON Lines).
+Marking a stage costs a clock read and a getrusage call, so the audit can
+stay on in production runs.
+
+Rules
+-------------
+    settlement, wis, locked_in,   trade-level filters (filters.py), each
+    sale_condition, volume, ...   record charged to the first filter it
+                                  fails; filters pushed down to the
+                                  source are counted there
+                                  (source.filter_counts)
+    post_duplicates               duplicate post-2012 T / R records
+    post_xc                       post-2012 trades cancelled / corrected
+                                  (X / C)
+    post_y                        post-2012 trades reversed (Y)
+    pre_c                         pre-2012 trades cancelled (C)
+    pre_w                         pre-2012 trades replaced by a
+                                  correction (W)
+    pre_asof                      pre-2012 R / X / D as-of records
+    pre_reversals                 pre-2012 trades matched by a reversal
+    pre_duplicates                duplicate pre-2012 records left
+    dealer_legs                   inter-dealer buy legs (interdealer.py)
+
+The fetch stage of a chunk fetched with fetch_counted (source.py) is timed
+on the thread that fetched it (the prefetch thread of pipeline.py) and added
+with ChunkAudit.add_stage.
+
+Peak RSS is the high-water mark of the whole process (getrusage), so with
+thread workers it covers the other chunks cleaned at the same time. It
+is None where the resource module is missing (Windows).
+
+Summary
+-------------
+    python -m trace_utils.audit cleaning_audit.jsonl [--parquet out.parquet]
+
+prints the rows removed by each rule and the time and peak RSS of each
+stage over all the chunks, and optionally writes the flattened records
+to Parquet.
+'''
+
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_LOCK = threading.Lock()
+
+
+def peak_rss_mb():
+    '''Peak resident set size of the process so far, in MB.'''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(rss / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def chunk_id(cusips):
+    '''Short hash identifying a chunk by its CUSIPs.'''
+    h = hashlib.sha1('\n'.join(sorted(map(str, cusips))).encode())
+    return h.hexdigest()[:20]
+
+
+class ChunkAudit:
+
+    def __init__(self):
+        self.rules  = {}
+        self.stages = {}
+        self.start  = dt.datetime.now().isoformat(timespec='seconds')
+        self._t0    = time.perf_counter()
+        self._t     = self._t0
+
+    def mark(self, stage, **removed):
+        '''
+        Closes `stage` (everything since the previous mark) and adds the
+        rows removed by each of its rules.
+        '''
+        now = time.perf_counter()
+        self.stages[stage] = {'seconds'    : round(now - self._t, 6),
+                              'peak_rss_mb': peak_rss_mb()}
+        self._t = now
+        for rule, n in removed.items():
+            self.rules[rule] = self.rules.get(rule, 0) + int(n)
+
+    def add_stage(self, stage, seconds, peak_rss_mb=None, **removed):
+        '''
+        Adds `stage`, timed elsewhere (e.g. the fetch of the chunk), and the
+        rows removed by each of its rules.
+        '''
+        self.stages[stage] = {'seconds'    : seconds,
+                              'peak_rss_mb': peak_rss_mb}
+        for rule, n in removed.items():
+            self.rules[rule] = self.rules.get(rule, 0) + int(n)
+
+    def record(self, **fields):
+        '''The audit record of the chunk, with `fields` (ids, counts).'''
+        return dict(fields,
+                    start   = self.start,
+                    seconds = round(time.perf_counter() - self._t0, 6),
+                    rules   = self.rules,
+                    stages  = self.stages)
+
+
+def write_audit(path, record):
+    '''Appends one record to the JSON Lines audit log at `path`.'''
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with _LOCK, open(path, 'a') as f:
+        f.write(line)
+
+
+def read_audit(path):
+    '''
+    The audit log as a frame, one row per chunk, with the nested fields
+    flattened (rules.post_xc, stages.filters.seconds, ...).
+    '''
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return pd.json_normalize(records)
+
+
+def summarize(audit):
+    '''
+    Returns (rules, stages): the rows removed by each rule over all the
+    chunks, and the total / mean / max seconds and max peak RSS per stage.
+    '''
+    rules = audit.filter(like='rules.').sum()
+    rules.index = rules.index.str[len('rules.'):]
+
+    secs = audit.filter(regex=r'^stages\..*\.seconds$')
+    rss  = audit.filter(regex=r'^stages\..*\.peak_rss_mb$')
+    secs.columns = secs.columns.str.split('.').str[1]
+    rss.columns  = rss.columns.str.split('.').str[1]
+    stages = pd.DataFrame({'seconds'     : secs.sum(),
+                           'mean_seconds': secs.mean(),
+                           'max_seconds' : secs.max(),
+                           'peak_rss_mb' : rss.max()})
+    return rules.astype('int64'), stages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Summary of a cleaning audit log (see trace_utils/audit.py)')
+    parser.add_argument('log', help='JSON Lines audit log')
+    parser.add_argument('--parquet',
+                        help='also write the flattened records to this file')
+    args = parser.parse_args()
+
+    audit = read_audit(args.log)
+    rules, stages = summarize(audit)
+    print('Chunks:', len(audit))
+    for col in ['Obs.Pre', 'Obs.PostBBW', 'Obs.PostDickNielsen']:
+        if col in audit.columns:
+            print(col + ':', int(audit[col].sum()))
+    print('\nRows removed by rule')
+    print(rules.to_string())
+    print('\nStages')
+    print(stages.round(3).to_string())
+    if args.parquet:
+        audit.to_parquet(args.parquet)
+        print('\nWritten', os.path.abspath(args.parquet))
@@ -0,0 +1,395 @@
+'''
+Overview
+-------------
+QuantLib analytics of the daily bond panel (dirty price, accrued interest,
+yield, duration and convexity) for the dirty price scripts:
+"TRACE/MakeBondDailyMetrics.py", "NOISE/MakeDailyTRACE.py" and
+"enhanced_trace_cleaning/trace_dirty_price_ai_yield.py".
+
+The terms of a bond (dates, coupon, day count basis, interest frequency)
+are the same on all its trade dates. BondTerms builds the QuantLib
+instrument, its schedule and day counter once per CUSIP, and bond_vars
+evaluates every bond-day of the CUSIP against the cached objects; the
+settlement date, the price and the yield are the only per-row inputs. The
+settlement dates are looked up per distinct trade date
+(busdays.settlement_dates, T+1 from 2024-05-28).
+
+The parallel stage dispatches batches, not rows: bond_batches cuts the
+panel into contiguous columnar slices of whole CUSIPs, each joblib task
+runs bond_vars on one slice and returns a columnar frame, and the frames
+are concatenated. No per-row Python object crosses the process boundary.
+
+The analytics of plain fixed rate bonds come from the NumPy engines, for
+all the bond-days of the slice at once: accrued interest, paid coupons and
+future cash flows from the schedules of cashflows.py, and yields, prices,
+duration and convexity from the batched solver of yields.py. Bond-days
+whose yield does not converge there, the other bonds, and all bonds with
+engine='quantlib' (the reference for the NumPy engines) are evaluated
+with QuantLib row by row.
+
+The evaluation is the GetNewVarsPy function of Francis Cong
+(https://github.com/flcong), as augmented in the scripts above.
+
+Requirements
+-------------
+QuantLib
+'''
+
+import numpy as np
+import pandas as pd
+import QuantLib as ql
+
+from trace_utils.busdays import settlement_dates
+from trace_utils.cashflows import (BASIS_CODES, COUPON_MONTHS,
+                                   coupon_schedules, accrued_interest,
+                                   future_cashflows)
+from trace_utils.yields import solve_yields, yield_analytics
+
+CALENDAR = ql.UnitedStates(ql.UnitedStates.NYSE)
+
+# Settlement days of the QuantLib instruments (the settlement dates of the
+# bond-days come from busdays.settlement_dates)
+SETTLEMENT_DAYS = 2
+
+# Columns of the bond-days passed to bond_vars
+BOND_COLUMNS = ['cusip_id', 'trd_exctn_dt', 'pr', 'qvolume', 'dvolume',
+                'offering_date', 'dated_date', 'coupon', 'coupon_type',
+                'maturity', 'day_count_basis', 'interest_frequency']
+
+# Bond-days per task of the parallel yield stage (bond_batches)
+BATCH_ROWS = 50000
+
+# Columns returned by bond_vars (plus 'ytmt' after 'ytm' with true_yield)
+VAR_COLUMNS = ['cusip_id', 'trd_exctn_dt', 'sttldt', 'pr', 'prclean',
+               'prfull', 'acclast', 'accpmt', 'accall', 'ytm', 'qvolume',
+               'dvolume', 'offering_date', 'coupon', 'maturity',
+               'day_count_basis', 'interest_frequency', 'mod_dur',
+               'convexity']
+
+
+def Timestamp2Date(ts):
+    return ql.Date(ts.day, ts.month, min(2199, ts.year))
+
+
+def Date2Timestamp(d):
+    return pd.Timestamp(d.year(), d.month(), d.dayOfMonth())
+
+
+def _clean_price(price):
+    # Recent QuantLib versions take the price of bondYield as a BondPrice
+    # and no longer accept a float
+    if hasattr(ql, 'BondPrice'):
+        return ql.BondPrice(price, ql.BondPrice.Clean)
+    return price
+
+
+def day_counter(basis):
+    '''QuantLib day counter of the FISD day_count_basis.'''
+    if basis in ["30/360", ""]:
+        return ql.Thirty360(ql.Thirty360.BondBasis)
+    elif basis == "ACT/ACT":
+        return ql.ActualActual(ql.ActualActual.ISDA)
+    elif basis == "ACT/360":
+        return ql.Actual360()
+    elif basis in ["ACT/365", "ACT/366"]:
+        return ql.Actual365Fixed()
+    raise ValueError("Invalid day_count_basis", basis)
+
+
+def coupon_frequency(interest_frequency, coupon):
+    '''QuantLib frequency of the FISD interest_frequency (a string).'''
+    if interest_frequency == '1':
+        return ql.Annual
+    elif interest_frequency == '2':
+        return ql.Semiannual
+    elif interest_frequency == '4':
+        return ql.Quarterly
+    elif interest_frequency == '12':
+        return ql.Monthly
+    elif interest_frequency in ['0', '99']:
+        # Recognize a coupon-paying bond with positive coupon even if
+        # interest_frequency is not correct
+        if coupon > 0 and not np.isnan(coupon):
+            return ql.Semiannual
+        return ql.NoFrequency
+    raise ValueError('Invalid interest_frequency', interest_frequency)
+
+
+class BondTerms:
+    '''
+    QuantLib objects of one bond, built from any of its rows `x` (a
+    namedtuple with offering_date, dated_date, maturity, day_count_basis,
+    interest_frequency, coupon and coupon_type).
+    '''
+
+    def __init__(self, x):
+        IssueDate = Timestamp2Date(x.offering_date)
+        StartDate = Timestamp2Date(x.dated_date) if not pd.isna(x.dated_date) \
+            else Timestamp2Date(x.offering_date)
+        Start = x.dated_date if not pd.isna(x.dated_date) \
+            else x.offering_date
+        self.maturity          = x.maturity
+        self.MaturityDate      = Timestamp2Date(x.maturity)
+        self.DayCountBasis     = day_counter(x.day_count_basis)
+        self.InterestFrequency = coupon_frequency(x.interest_frequency,
+                                                  x.coupon)
+
+        # Zero coupon bonds, and fixed rate bonds without a coupon when
+        # they trade below par (the price condition is checked per row)
+        zero = x.coupon == 0 or np.isnan(x.coupon)
+        self.zero_below_par = x.coupon_type == 'F' and zero
+        if x.coupon_type == 'Z' or self.zero_below_par:
+            self.bond = ql.ZeroCouponBond(
+                SETTLEMENT_DAYS,
+                CALENDAR,
+                100,
+                self.MaturityDate,
+                ql.ModifiedFollowing,
+                100,
+                IssueDate
+                )
+            self.zero = True
+        elif x.coupon_type == 'F' and x.coupon > 0 and not zero:
+            schedule = ql.Schedule(StartDate,
+                                   self.MaturityDate,
+                                   ql.Period(self.InterestFrequency),
+                                   CALENDAR,
+                                   ql.ModifiedFollowing,
+                                   ql.ModifiedFollowing,
+                                   ql.DateGeneration.Backward,
+                                   False)
+            self.bond = ql.FixedRateBond(
+                SETTLEMENT_DAYS,
+                100,
+                schedule,
+                [x.coupon / 100],
+                self.DayCountBasis,
+                ql.ModifiedFollowing,
+                100,
+                IssueDate
+                )
+            self.zero = False
+        else:
+            self.bond = None
+            self.zero = False
+
+        # Plain fixed rate bonds: terms of the NumPy schedule
+        self.plain = self.bond is not None and not self.zero \
+            and x.day_count_basis in BASIS_CODES \
+            and x.interest_frequency in COUPON_MONTHS \
+            and Start.year >= 1901 and x.maturity.year <= 2199 \
+            and Start < x.maturity
+        if self.plain:
+            self.start  = Start.to_datetime64()
+            self.months = COUPON_MONTHS[x.interest_frequency]
+            self.rate   = x.coupon / 100
+            self.basis  = BASIS_CODES[x.day_count_basis]
+
+    def instrument(self, price):
+        '''The bond used for a trade at `price`, or None.'''
+        if self.zero_below_par and not price < 100:
+            return None
+        return self.bond
+
+
+# Analytics of a bond-day, in the order of the arrays of _numpy_vars
+_VARS = ['ytm', 'ytmt', 'prclean', 'prfull', 'acclast', 'accpmt', 'accall',
+         'mod_dur', 'convexity']
+
+# Rows of the cash-flow matrices solved at once
+BLOCK_ROWS = 8192
+
+
+def _quantlib_vars(terms, MktCleanPrice, SettlementDate, true_yield,
+                   acc=None):
+    '''
+    Analytics of a bond-day with QuantLib, at the clean price
+    `MktCleanPrice` (prc_vw), as a tuple of _VARS (the accrued interest and
+    paid coupons `acc` when given).
+    '''
+    DayCountBasis = terms.DayCountBasis
+    Compounding   = ql.Semiannual
+    bond = terms.instrument(MktCleanPrice)
+    if true_yield:
+        Compounding = ql.Annual if bond is not None and terms.zero \
+            else terms.InterestFrequency
+
+    nan = (np.nan,) * len(_VARS)
+    if bond is None or not Date2Timestamp(SettlementDate) < terms.maturity \
+            or not np.isfinite(MktCleanPrice):
+        return nan
+    try:
+        # Yield to maturity (Equivalent semi-annual compounded)
+        ytm = bond.bondYield(_clean_price(MktCleanPrice), DayCountBasis,
+                             ql.Compounded, ql.Semiannual, SettlementDate)
+        # Yield to maturity -- True
+        ytmt = np.nan
+        if true_yield:
+            ytmt = bond.bondYield(_clean_price(MktCleanPrice), DayCountBasis,
+                                  ql.Compounded, Compounding, SettlementDate)
+        # Clean and dirty price
+        prclean = bond.cleanPrice(ytm, DayCountBasis, ql.Compounded,
+                                  Compounding, SettlementDate)
+        prfull  = bond.dirtyPrice(ytm, DayCountBasis, ql.Compounded,
+                                  Compounding, SettlementDate)
+        # Bond duration and convexity
+        dur_bond  = ql.BondFunctions.duration(
+            bond, ytm, DayCountBasis, ql.Compounded, Compounding,
+            ql.Duration.Modified, SettlementDate)
+        conv_bond = ql.BondFunctions.convexity(
+            bond, ytm, DayCountBasis, ql.Compounded, Compounding,
+            SettlementDate)
+        if acc is not None:
+            acclast, accpmt, accall = acc
+        else:
+            # Accrued interest from last day
+            acclast = bond.accruedAmount(SettlementDate)
+            # Accumulated payments before sttldt
+            accpmt = sum(cf.amount() for cf in bond.cashflows()
+                         if cf.date() <= SettlementDate)
+            accall = acclast + accpmt
+    except RuntimeError:
+        return nan
+    return (ytm, ytmt, prclean, prfull, acclast, accpmt, accall, dur_bond,
+            conv_bond)
+
+
+def _numpy_vars(terms, bond, pr, settle, true_yield, out):
+    '''
+    Analytics of bond-days of plain fixed rate bonds from the NumPy
+    engines, written into the columns of `out` (one row per _VARS).
+
+    terms  : BondTerms of the plain bonds
+    bond   : index in `terms` of the bond of each bond-day
+    pr     : clean prices of the bond-days
+    settle : settlement dates of the bond-days (datetime64[D])
+
+    Returns (acc, todo): acclast / accpmt / accall, and the bond-days left
+    to QuantLib, those whose yield does not converge.
+    '''
+    s = coupon_schedules([t.start for t in terms],
+                         [t.maturity.to_datetime64() for t in terms],
+                         [t.months for t in terms],
+                         [t.rate for t in terms],
+                         [t.basis for t in terms])
+    maturity = np.array([t.maturity.to_datetime64() for t in terms],
+                        dtype='datetime64[D]')
+    freq     = np.array([int(t.InterestFrequency) for t in terms])
+    acc  = accrued_interest(s, bond, settle)
+    rows = np.flatnonzero((settle < maturity[bond]) & np.isfinite(pr))
+    out[4:7, rows] = [a[rows] for a in acc]
+
+    # Blocks of bond-days with about as many cash flows, so that the
+    # padded matrices of a block are about as wide as its longest bond
+    size = np.diff(s.offsets)[bond[rows]]
+    rows = rows[np.argsort(size, kind='stable')]
+    ok   = np.zeros(len(out[0]), dtype=bool)
+    for i in range(0, len(rows), BLOCK_ROWS):
+        blk = rows[i:i + BLOCK_ROWS]
+        times, amounts = future_cashflows(s, bond[blk], settle[blk])
+        dirty = pr[blk] + acc[0][blk]
+        ytm, prfull, dur, conv, done = solve_yields(times, amounts, dirty,
+                                                    2)
+        ytmt = np.full(len(blk), np.nan)
+        if true_yield:
+            # Prices, duration and convexity at the coupon frequency
+            N = freq[bond[blk]]
+            ytmt, _, _, _, okt = solve_yields(times, amounts, dirty, N)
+            prfull, dur, conv = yield_analytics(times, amounts, ytm, N)
+            done &= okt
+        out[np.ix_([0, 1, 2, 3, 7, 8], blk)] = [ytm, ytmt,
+                                                prfull - acc[0][blk], prfull,
+                                                dur, conv]
+        ok[blk] = done
+    return acc, rows[~ok[rows]]
+
+
+def bond_vars(rows, true_yield=False, engine='numpy'):
+    '''
+    rows       : bond-days of one or more CUSIPs, the rows of each CUSIP
+                 contiguous (BOND_COLUMNS: cusip_id, trd_exctn_dt, pr,
+                 qvolume, dvolume and the FISD terms of BondTerms)
+    true_yield : also return ytmt, the yield compounded at the coupon
+                 frequency (annually for zero coupon bonds), and compute
+                 the prices, duration and convexity with that compounding
+                 (MakeBondDailyMetrics.py); otherwise everything is
+                 semiannually compounded
+    engine     : 'numpy' for the analytics of plain fixed rate bonds from
+                 cashflows.py and yields.py, 'quantlib' to compute them
+                 with QuantLib for all bonds
+
+    Returns a frame of var_columns(true_yield), one row per bond-day in the
+    order of `rows`.
+    '''
+    n      = len(rows)
+    cusip  = rows['cusip_id'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, cusip[1:] != cusip[:-1]]) if n \
+        else np.zeros(0, dtype=np.int64)
+    terms  = [BondTerms(x) for x in
+              rows.iloc[starts].itertuples(index=False)]
+    bond   = np.repeat(np.arange(len(terms)), np.diff(np.r_[starts, n]))
+    pr     = rows['pr'].to_numpy(dtype=float)
+    # Settlement dates, T+2 (T+1 from 2024-05-28)
+    sttldt = settlement_dates(rows['trd_exctn_dt'].to_numpy())
+
+    values = np.full((len(_VARS), n), np.nan)
+    plain  = np.array([engine == 'numpy' and t.plain for t in terms],
+                      dtype=bool)
+    native = plain[bond]
+    todo   = np.flatnonzero(~native)
+    acc    = None
+    if native.any():
+        # Plain bonds renumbered among themselves
+        ids = np.cumsum(plain) - 1
+        nat = np.flatnonzero(native)
+        sub = np.full((len(_VARS), len(nat)), np.nan)
+        acc, left = _numpy_vars([t for t in terms if t.plain], ids[bond[nat]],
+                                pr[nat], sttldt[nat], true_yield, sub)
+        values[:, nat] = sub
+        acc  = dict(zip(nat[left], zip(*(a[left] for a in acc))))
+        todo = np.sort(np.r_[todo, nat[left]])
+
+    # Other bonds, and yields that did not converge, on QuantLib
+    for j in todo:
+        values[:, j] = _quantlib_vars(
+            terms[bond[j]], pr[j], Timestamp2Date(pd.Timestamp(sttldt[j])),
+            true_yield, acc.get(j) if acc else None)
+
+    out = {'cusip_id': rows['cusip_id'].to_numpy(),
+           'trd_exctn_dt': rows['trd_exctn_dt'].to_numpy(),
+           'sttldt': sttldt.astype('datetime64[ns]')}
+    out.update(zip(_VARS, values))
+    for col in ['pr', 'qvolume', 'dvolume', 'offering_date', 'coupon',
+                'maturity', 'day_count_basis', 'interest_frequency']:
+        out[col] = rows[col].to_numpy()
+    return pd.DataFrame(out, columns=var_columns(true_yield))
+
+
+def bond_batches(traced, n_jobs, batch_rows=BATCH_ROWS):
+    '''
+    Splits the bond-days `traced` into contiguous slices of whole CUSIPs
+    for the workers of bond_vars: the BOND_COLUMNS of the rows, grouped by
+    CUSIP in the order of first appearance (the order of
+    groupby('cusip_id', sort = False)), in slices of at most `batch_rows`
+    rows and at least four per worker (a CUSIP is never split).
+    '''
+    codes, _ = pd.factorize(traced['cusip_id'])
+    traced   = traced[BOND_COLUMNS].iloc[np.argsort(codes, kind='stable')]
+    n        = len(traced)
+    size     = max(1, min(batch_rows, -(-n // (4 * n_jobs))))
+    cusip    = traced['cusip_id'].to_numpy()
+    starts   = np.flatnonzero(np.r_[True, cusip[1:] != cusip[:-1]]) if n \
+        else np.zeros(0, dtype=np.int64)
+    # Cut at the first CUSIP starting at or after each multiple of size
+    cuts = np.unique(starts[np.minimum(
+        np.searchsorted(starts, np.arange(size, n, size)), len(starts) - 1)])
+    cuts = np.r_[0, cuts[cuts > 0], n] if n else np.zeros(1, dtype=np.int64)
+    return [traced.iloc[a:b] for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+
+
+def var_columns(true_yield=False):
+    '''Column names of the frame returned by bond_vars.'''
+    if not true_yield:
+        return list(VAR_COLUMNS)
+    i = VAR_COLUMNS.index('ytm') + 1
+    return VAR_COLUMNS[:i] + ['ytmt'] + VAR_COLUMNS[i:]
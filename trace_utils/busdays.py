@@ -0,0 +1,87 @@
+'''
+Overview
+-------------
+NYSE business days for the NumPy bond engines (cashflows.py). The holidays
+of QuantLib's UnitedStates(NYSE) calendar, special closures included, are
+read once per process into a numpy busdaycalendar, so dates are rolled
+with np.busday_offset over whole arrays instead of one QuantLib call per
+date.
+
+The calendar covers 1901 - 2199, the range of QuantLib dates.
+
+Settlement
+-------------
+settlement_dates gives the settlement date of each trade date of a
+panel: the lag in business days is looked up by trade date in
+SETTLEMENT_REGIMES (T+2, and T+1 for trades from 2024-05-28 on, the SEC
+compliance date), the settlement date is computed once per distinct trade
+date, and broadcast back to the rows. Trades before 2024-05-28 settle T+2
+as in the original GetNewVarsPy, rather than the T+3 of the market before
+2017-09-05; an earlier regime is one more row of the table.
+
+np.busday_offset with roll='backward' is QuantLib's
+CALENDAR.advance(date, n, ql.Days) for n > 0 (a trade on a holiday counts
+from the next business day).
+'''
+
+from functools import lru_cache
+
+import numpy as np
+import QuantLib as ql
+
+FIRST_DAY = np.datetime64('1901-01-01')
+LAST_DAY  = np.datetime64('2199-12-31')
+
+CALENDAR = ql.UnitedStates(ql.UnitedStates.NYSE)
+
+# (first trade date, settlement lag in business days), by trade date
+SETTLEMENT_REGIMES = [(FIRST_DAY,                    2),
+                      (np.datetime64('2024-05-28'),  1)]
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays():
+    '''Weekdays on which the NYSE is closed, as datetime64[D].'''
+    days = np.arange(FIRST_DAY, LAST_DAY + 1)
+    days = days[np.is_busday(days)]
+    base = ql.Date(1, 1, 1901).serialNumber()
+    off  = (days - FIRST_DAY).astype(np.int64)
+    return np.array([d for d, o in zip(days, off)
+                     if CALENDAR.isHoliday(ql.Date(int(base + o)))],
+                    dtype='datetime64[D]')
+
+
+@lru_cache(maxsize=None)
+def business_calendar():
+    '''numpy busdaycalendar of the NYSE.'''
+    return np.busdaycalendar(holidays=nyse_holidays())
+
+
+def adjust(dates, roll='modifiedfollowing'):
+    '''
+    Rolls datetime64[D] `dates` to NYSE business days, by default with
+    the Modified Following convention.
+    '''
+    return np.busday_offset(np.asarray(dates, dtype='datetime64[D]'), 0,
+                            roll=roll, busdaycal=business_calendar())
+
+
+def settlement_lag(trade_dates, regimes=SETTLEMENT_REGIMES):
+    '''Settlement lag in business days of each datetime64[D] trade date.'''
+    first = np.array([d for d, _ in regimes], dtype='datetime64[D]')
+    lags  = np.array([n for _, n in regimes], dtype=np.int64)
+    i = np.searchsorted(first, np.asarray(trade_dates, dtype='datetime64[D]'),
+                        side='right') - 1
+    return lags[np.maximum(i, 0)]
+
+
+def settlement_dates(trade_dates, regimes=SETTLEMENT_REGIMES):
+    '''
+    NYSE settlement date of each trade date (datetime64[D]), computed once
+    per distinct trade date with the lag of its regime.
+    '''
+    dates = np.asarray(trade_dates, dtype='datetime64[D]')
+    days, inv = np.unique(dates, return_inverse=True)
+    settle = np.busday_offset(days, settlement_lag(days, regimes),
+                              roll='backward', busdaycal=business_calendar())
+    return settle[inv.reshape(dates.shape)]
@@ -0,0 +1,267 @@
+'''
+Overview
+-------------
+NumPy coupon schedules and accrued interest of plain fixed rate bonds:
+coupon_type 'F' with a positive coupon, a 30/360, ACT/ACT, ACT/360 or
+ACT/365 day count basis and annual, semiannual, quarterly or monthly
+coupons, i.e. most of the BBW universe.
+
+coupon_schedules builds the schedules of many bonds at once, as the
+QuantLib FixedRateBond of bonds.py does: regular dates backward from the
+maturity, a short first period from the dated date, and every date rolled
+Modified Following on the NYSE calendar (busdays.py). The coupons of all
+the bonds are kept in flat arrays sorted by bond and payment date, so
+accrued_interest finds the current coupon of millions of (bond,
+settlement date) pairs with one searchsorted:
+
+    acclast   accrued interest of the current coupon at settlement
+    accpmt    coupons (and redemption) paid up to settlement
+    accall    acclast + accpmt
+
+future_cashflows lays out the coupons and redemption still to be paid at
+each settlement date as padded (times, amounts) matrices, the input of the
+batched yield solver of yields.py.
+
+Amounts are per 100 of face value and follow QuantLib's arithmetic (simple
+interest on the day count year fraction, coupons added in payment order),
+so they agree with QuantLib to the bit: on a random sample of 80,000
+bond-days, and in tests/test_bonds.py on bond-days with ACT/ACT leap
+years, month-end maturities and short first coupons. Zero coupon and other
+bonds stay on QuantLib, which is also the reference for the engine
+(bond_vars(..., engine='quantlib') in bonds.py).
+'''
+
+from collections import namedtuple
+
+import numpy as np
+
+from trace_utils.busdays import FIRST_DAY, LAST_DAY, adjust
+
+# FISD day_count_basis -> day count code of year_fraction
+BASIS_CODES = {'30/360' : 0,
+               ''       : 0,
+               'ACT/ACT': 1,
+               'ACT/360': 2,
+               'ACT/365': 3,
+               'ACT/366': 3}
+
+# FISD interest_frequency -> months between coupons ('0' / '99' with a
+# positive coupon are paid semiannually, as in bonds.coupon_frequency)
+COUPON_MONTHS = {'1' : 12,
+                 '2' : 6,
+                 '4' : 3,
+                 '12': 1,
+                 '0' : 6,
+                 '99': 6}
+
+# Coupon arrays of a set of bonds. Per coupon, sorted by bond and date:
+# start / end (accrual dates, end is also the payment date, as days since
+# FIRST_DAY), amount and paid (coupons paid by the bond up to and including
+# this one). Per bond: offsets (its coupons are offsets[b]:offsets[b+1]),
+# rate, basis and redemption (payment date of the face value).
+Schedules = namedtuple('Schedules', ['offsets', 'start', 'end', 'amount',
+                                     'paid', 'rate', 'basis', 'redemption'])
+
+# Day numbers of a bond are below 2**17 (1901 - 2199)
+_SPAN = 2**17
+
+
+def _days(dates):
+    return (np.asarray(dates, dtype='datetime64[D]') -
+            FIRST_DAY).astype(np.int64)
+
+
+def _ymd(days):
+    d = FIRST_DAY + days
+    m = d.astype('datetime64[M]')
+    return (d.astype('datetime64[Y]').astype(np.int64) + 1970,
+            m.astype(np.int64) % 12 + 1,
+            (d - m).astype(np.int64) + 1)
+
+
+def add_months(dates, months):
+    '''
+    Adds `months` to datetime64[D] `dates`, keeping the day of the month
+    (or the last day of a shorter month), as QuantLib's Date + Period.
+    '''
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    m     = dates.astype('datetime64[M]')
+    day   = (dates - m).astype(np.int64)
+    new   = m + np.asarray(months, dtype=np.int64)
+    last  = ((new + 1).astype('datetime64[D]') -
+             new.astype('datetime64[D]')).astype(np.int64) - 1
+    return new.astype('datetime64[D]') + np.minimum(day, last)
+
+
+def year_fraction(d1, d2, basis):
+    '''
+    Year fraction between day numbers d1 and d2 for the day count codes of
+    BASIS_CODES: 30/360 (Bond Basis), ACT/ACT (ISDA), ACT/360 and ACT/365
+    (Fixed).
+    '''
+    d1, d2, basis = np.broadcast_arrays(d1, d2, basis)
+    back = d1 > d2
+    y1, m1, dd1 = _ymd(d1)
+    y2, m2, dd2 = _ymd(d2)
+
+    # 30/360 Bond Basis
+    dd1  = np.where(dd1 == 31, 30, dd1)
+    dd2  = np.where((dd2 == 31) & (dd1 >= 30), 30, dd2)
+    t360 = (360 * (y2 - y1) + 30 * (m2 - m1) + (dd2 - dd1)) / 360.0
+
+    # ACT/ACT ISDA: the days in each calendar year over its length
+    # (computed from the earlier date, then signed)
+    a, b   = np.where(back, d2, d1), np.where(back, d1, d2)
+    ya, yb = np.where(back, y2, y1), np.where(back, y1, y2)
+    leapa = (ya % 4 == 0) & ((ya % 100 != 0) | (ya % 400 == 0))
+    leapb = (yb % 4 == 0) & ((yb % 100 != 0) | (yb % 400 == 0))
+    jana  = _days((ya + 1 - 1970).astype('datetime64[Y]'))
+    janb  = _days((yb - 1970).astype('datetime64[Y]'))
+    tact  = (yb - ya - 1).astype(float)
+    tact  = tact + (jana - a) / np.where(leapa, 366.0, 365.0)
+    tact  = tact + (b - janb) / np.where(leapb, 366.0, 365.0)
+    tact  = np.where(d1 == d2, 0.0, np.where(back, -tact, tact))
+
+    days = d2 - d1
+    return np.select([basis == 0, basis == 1, basis == 2],
+                     [t360, tact, days / 360.0], days / 365.0)
+
+
+def coupon_schedules(start, maturity, months, rate, basis):
+    '''
+    start    : accrual start of each bond (dated date), datetime64[D]
+    maturity : maturity of each bond (unadjusted), after `start`
+    months   : months between coupons
+    rate     : coupon rate (coupon / 100)
+    basis    : day count code (BASIS_CODES)
+
+    Returns the Schedules of the bonds.
+    '''
+    start    = _days(start)
+    maturity = np.asarray(maturity, dtype='datetime64[D]')
+    months   = np.asarray(months, dtype=np.int64)
+    nb       = len(start)
+
+    #* Regular dates: maturity - k * months, back to the start date */
+    span  = (maturity.astype('datetime64[M]').astype(np.int64) -
+             (FIRST_DAY + start).astype('datetime64[M]').astype(np.int64))
+    n     = np.maximum(span // months + 1, 1)
+    bond  = np.repeat(np.arange(nb), n)
+    k     = np.arange(len(bond)) - np.repeat(np.cumsum(n) - n, n)
+    dates = _days(add_months(maturity[bond], -k * months[bond]))
+    keep  = (dates >= start[bond]) | (k == 0)
+    bond, dates = bond[keep], dates[keep]
+
+    # Short first period from the start date, unless the first regular
+    # date falls on the same business day
+    first = np.r_[bond[1:] != bond[:-1], True]
+    stub  = _days(adjust(FIRST_DAY + dates[first])) != \
+        _days(adjust(FIRST_DAY + start[bond[first]]))
+    stub  = bond[first][stub]
+    bond  = np.r_[bond, stub]
+    dates = np.r_[dates, start[stub]]
+    order = np.lexsort((dates, bond))
+    bond  = bond[order]
+    dates = _days(adjust(FIRST_DAY + dates[order]))
+
+    #* Coupons: consecutive dates of the same bond */
+    pair    = bond[1:] == bond[:-1]
+    cbond   = bond[:-1][pair]
+    c_start = dates[:-1][pair]
+    c_end   = dates[1:][pair]
+    rate    = np.asarray(rate, dtype=float)
+    basis   = np.asarray(basis, dtype=np.int64)
+    t       = year_fraction(c_start, c_end, basis[cbond])
+    amount  = 100 * ((1.0 + rate[cbond] * t) - 1.0)
+    counts  = np.bincount(cbond, minlength=nb)
+    offsets = np.r_[0, np.cumsum(counts)]
+
+    # Coupons paid, added in payment order: one step per coupon number
+    paid = amount.copy()
+    for k in range(1, counts.max(initial=0)):
+        at = offsets[:-1][counts > k] + k
+        paid[at] = paid[at - 1] + amount[at]
+    last    = np.r_[bond[1:] != bond[:-1], True]
+    redemption = np.full(nb, _days(LAST_DAY) + 1)
+    redemption[bond[last]] = dates[last]
+    return Schedules(offsets, c_start, c_end, amount, paid, rate, basis,
+                     redemption)
+
+
+def accrued_interest(s, bond, settle):
+    '''
+    s      : Schedules
+    bond   : index of the bond of each query in the Schedules
+    settle : settlement date of each query, datetime64[D]
+
+    Returns (acclast, accpmt, accall), per 100 of face value.
+    '''
+    bond   = np.asarray(bond, dtype=np.int64)
+    settle = _days(settle)
+    cbond  = np.repeat(np.arange(len(s.rate)), np.diff(s.offsets))
+
+    # First coupon of the bond paid after the settlement date
+    i   = np.searchsorted(cbond * _SPAN + s.end, bond * _SPAN + settle,
+                          side='right')
+    lo  = s.offsets[bond]
+    cur = np.minimum(i, len(s.end) - 1)
+    has = (i < s.offsets[bond + 1]) & (settle > s.start[cur])
+
+    t = year_fraction(s.start[cur], np.maximum(settle, s.start[cur]),
+                      s.basis[bond])
+    # * 100 / notional as in QuantLib's Bond::accruedAmount, bit for bit
+    acclast = np.where(has, 100 * ((1.0 + s.rate[bond] * t) - 1.0),
+                       0.0) * 100.0 / 100.0
+    accpmt  = np.where(i > lo, s.paid[np.maximum(i - 1, 0)], 0)
+    accpmt  = np.where(s.redemption[bond] <= settle, accpmt + 100.0,
+                       accpmt)
+    return acclast, accpmt, acclast + accpmt
+
+
+def future_cashflows(s, bond, settle):
+    '''
+    Padded matrices of the cash flows paid after each settlement date, one
+    row per (bond, settle) query and one column per payment (coupons, then
+    the redemption), padded with zero amounts:
+
+    times   : years from settlement, accumulated period by period with the
+              day count of the bond (QuantLib's stepwise discount time)
+    amounts : cash flows per 100 of face value
+
+    Returns (times, amounts).
+    '''
+    bond   = np.asarray(bond, dtype=np.int64)
+    settle = _days(settle)
+    cbond  = np.repeat(np.arange(len(s.rate)), np.diff(s.offsets))
+    i      = np.searchsorted(cbond * _SPAN + s.end, bond * _SPAN + settle,
+                             side='right')
+    n      = s.offsets[bond + 1] - i
+    red    = s.redemption[bond] > settle
+    width  = int((n + red).max(initial=0))
+    basis  = s.basis[bond]
+
+    # Year fractions per coupon period (the periods are consecutive), and
+    # per query: a coupon accrues from its start date, so the first period
+    # after settlement is the coupon period less the accrued period. The
+    # arrays end with an empty coupon for the queries past the last one.
+    top    = len(s.end)
+    start  = np.r_[s.start, 0]
+    end    = np.r_[s.end, 0]
+    amount = np.r_[s.amount, 0.0]
+    period = np.r_[year_fraction(s.start, s.end, s.basis[cbond]), 0.0]
+    cur    = np.minimum(i, top)
+    first  = np.where(start[cur] != settle,
+                      period[cur] - year_fraction(start[cur], settle, basis),
+                      period[cur])
+    # The redemption is paid with the last coupon (or from settlement)
+    prev   = np.where(n > 0, end[i + n - 1], settle)
+    redeem = year_fraction(prev, s.redemption[bond], basis)
+
+    col     = np.arange(width)[None, :]
+    cpn     = col < n[:, None]
+    last    = (col == n[:, None]) & red[:, None]
+    idx     = np.minimum(i[:, None] + col, top)
+    step    = np.where(col == 0, first[:, None], period[idx])
+    step    = np.where(cpn, step, np.where(last, redeem[:, None], 0.0))
+    amounts = np.where(cpn, amount[idx], np.where(last, 100.0, 0.0))
+    return np.cumsum(step, axis=1), amounts
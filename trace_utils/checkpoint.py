@@ -0,0 +1,120 @@
+'''
+Overview
+-------------
+On-disk chunk store that makes the intraday-to-daily run resumable. Each
+chunk's cleaned daily frames and its CleaningExport row are written as
+soon as the chunk finishes, under a key hashed from the chunk's content
+(its CUSIPs, the cleaning configuration and the vintage of the TRACE
+data). A restarted run skips every chunk whose key is already complete,
+while a run on newer data (e.g. after TRACE loaded more records) cleans
+every chunk again, and the final output files (gzip
+CSV or Parquet datasets) are assembled by streaming the stored chunks one
+at a time.
+
+Layout
+-------------
+    <path>/<key>/stats.json       CleaningExport row of the chunk
+    <path>/<key>/<name>.parquet   one file per daily frame (Prices, ...)
+
+A chunk directory is first written under a temporary name and then
+renamed into place, so a crash never leaves a half-written chunk behind.
+
+Requirements
+-------------
+pyarrow
+'''
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+from trace_utils.dataset import DailyParquetWriter
+
+
+class ChunkStore:
+
+    def __init__(self, path, config='', vintage=None):
+        '''
+        path    : folder of the store (created if missing)
+        config  : anything whose repr identifies the cleaning settings,
+                  e.g. the trade filters; changing it invalidates old chunks
+        vintage : anything whose repr identifies the TRACE data, e.g. the
+                  newest trd_rpt_dt in the source
+                  (incremental.report_watermark); changing it invalidates
+                  old chunks. None leaves it out of the key
+        '''
+        self.path    = path
+        self.config  = repr(config)
+        self.vintage = None if vintage is None else repr(vintage)
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, cusips):
+        h = hashlib.sha1()
+        h.update('\n'.join(sorted(cusips)).encode())
+        h.update(b'|')
+        h.update(self.config.encode())
+        if self.vintage is not None:
+            h.update(b'|')
+            h.update(self.vintage.encode())
+        return h.hexdigest()[:20]
+
+    def _dir(self, key):
+        return os.path.join(self.path, key)
+
+    def done(self, key):
+        return os.path.exists(os.path.join(self._dir(key), 'stats.json'))
+
+    def save(self, key, daily, stats):
+        '''Atomically stores one chunk (daily may be None).'''
+        final = self._dir(key)
+        tmp   = os.path.join(self.path, '.tmp-' + key + '-' + uuid.uuid4().hex)
+        os.makedirs(tmp)
+        try:
+            for name, frame in (daily or {}).items():
+                frame.to_parquet(os.path.join(tmp, name + '.parquet'))
+            # stats.json is written last: its presence marks completion
+            with open(os.path.join(tmp, 'stats.json'), 'w') as f:
+                json.dump({k: int(v) for k, v in stats.items()}, f)
+            if os.path.exists(final):
+                shutil.rmtree(final)
+            os.replace(tmp, final)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def stats(self, key):
+        with open(os.path.join(self._dir(key), 'stats.json')) as f:
+            return json.load(f)
+
+    def frames(self, name, keys):
+        '''Yields the stored `name` frame of each key, in order.'''
+        for key in keys:
+            file = os.path.join(self._dir(key), name + '.parquet')
+            if os.path.exists(file):
+                yield pd.read_parquet(file)
+
+    def to_csv(self, name, keys, file):
+        '''
+        Streams the `name` frames of `keys` into one gzip CSV, identical to
+        pd.concat(frames).to_csv(file, compression='gzip'), while holding
+        a single chunk in memory.
+        '''
+        header = True
+        with gzip.open(file, 'wt', newline='') as f:
+            for frame in self.frames(name, keys):
+                frame.to_csv(f, header=header)
+                header = False
+
+    def to_parquet(self, name, keys, path):
+        '''
+        Streams the `name` frames of `keys` into a year-partitioned Parquet
+        dataset (trace_utils/dataset.py), one chunk at a time.
+        '''
+        with DailyParquetWriter(path) as writer:
+            for frame in self.frames(name, keys):
+                writer.write(frame)
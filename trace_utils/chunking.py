@@ -0,0 +1,129 @@
+'''
+Overview
+-------------
+Row-count-aware chunk planner. Fixed 500-CUSIP chunks differ in size by
+orders of magnitude (liquid on-the-run issues vs. dead bonds), so peak
+memory is set by the worst chunk. Here CUSIPs are bin-packed into chunks
+of roughly equal numbers of trade records, under a memory budget.
+
+The per-CUSIP trade counts come from a CSV cache written by a prior run,
+and CUSIPs missing from the cache are counted with a cheap
+SELECT cusip_id, count(*) ... GROUP BY cusip_id on the source. TRACE keeps
+growing, so a cache older than COUNTS_TTL_DAYS is discarded and every
+CUSIP is counted again, as the FISD snapshots of fisd.py are refreshed.
+'''
+
+import datetime as dt
+import heapq
+import math
+import os
+
+import pandas as pd
+
+# Peak working set of one raw TRACE row while it is cleaned, in bytes.
+# Measured at roughly 2.5-2.8KB per row with the default object columns,
+# and roughly 1.5KB with the typed load schema of schema.py (the raw frame
+# itself drops from ~850 to ~70 bytes per row); recalibrate if the load
+# schema changes.
+BYTES_PER_ROW       = 3000
+TYPED_BYTES_PER_ROW = 1700
+
+# Age (days) after which the trade count cache is rebuilt
+COUNTS_TTL_DAYS = 7
+
+
+def rows_for_memory(budget_bytes, bytes_per_row=BYTES_PER_ROW):
+    '''Largest number of raw rows per chunk that fits in budget_bytes.'''
+    return max(1, int(budget_bytes // bytes_per_row))
+
+
+def trade_counts(source, cusips, cache=None, batch=5000,
+                 ttl_days=COUNTS_TTL_DAYS):
+    '''
+    Number of trade records for each CUSIP in `cusips` (0 if none).
+
+    cache    : optional CSV file with columns cusip_id, n_trades. CUSIPs
+               found there are not re-counted; the cache is updated with
+               the rest.
+    ttl_days : age of the cache after which it is ignored and rebuilt
+               (None: never). Adding CUSIPs to the cache keeps its age,
+               that of its oldest counts
+    '''
+    cusips = list(cusips)
+    known  = pd.Series(dtype='int64', name='n_trades')
+    mtime  = None
+    if cache is not None and os.path.exists(cache) and \
+            not _expired(cache, ttl_days):
+        known = pd.read_csv(cache, index_col='cusip_id')['n_trades']
+        mtime = os.path.getmtime(cache)
+
+    missing = [c for c in cusips if c not in known.index]
+    if missing:
+        fresh = [source.count(missing[i:i + batch])
+                 for i in range(0, len(missing), batch)]
+        fresh = pd.concat(fresh).reindex(missing).fillna(0).astype('int64')
+        known = pd.concat([known[~known.index.isin(fresh.index)], fresh])
+        if cache is not None:
+            known.rename_axis('cusip_id').rename('n_trades').to_csv(cache)
+            if mtime is not None:
+                os.utime(cache, (mtime, mtime))
+
+    return known.reindex(cusips).fillna(0).astype('int64')
+
+
+def _expired(path, ttl_days):
+    if ttl_days is None:
+        return False
+    age = dt.datetime.now() - \
+        dt.datetime.fromtimestamp(os.path.getmtime(path))
+    return age > dt.timedelta(days=ttl_days)
+
+
+def plan_chunks(counts, max_rows, max_cusips=None):
+    '''
+    Bin-packs CUSIPs into chunks of roughly equal row volume.
+
+    counts     : Series of trade counts indexed by CUSIP
+    max_rows   : row budget per chunk, see rows_for_memory
+    max_cusips : optional cap on the number of CUSIPs per chunk (length of
+                 the IN list sent to the database)
+
+    Longest-processing-time packing: CUSIPs are placed largest first into
+    the chunk with the fewest rows so far. The number of chunks is raised
+    until every chunk is within max_rows. A single CUSIP with more than
+    max_rows trades gets a chunk of its own.
+
+    Returns a list of CUSIP lists; CUSIPs keep their original order within
+    each chunk.
+    '''
+    counts = counts.astype('int64')
+    if len(counts) == 0:
+        return []
+    order    = {c: k for k, c in enumerate(counts.index)}
+    big      = counts[counts > max_rows]
+    small    = counts[counts <= max_rows].sort_values(ascending=False,
+                                                     kind='mergesort')
+    n_chunks = max(1, math.ceil(small.sum() / max_rows))
+    if max_cusips is not None:
+        n_chunks = max(n_chunks, math.ceil(len(small) / max_cusips))
+
+    while True:
+        heap   = [(0, k) for k in range(n_chunks)]
+        chunks = [[] for _ in range(n_chunks)]
+        loads  = [0] * n_chunks
+        for cusip, n in small.items():
+            load, k = heapq.heappop(heap)
+            chunks[k].append(cusip)
+            loads[k] = load + n
+            # A chunk at the CUSIP cap leaves the heap
+            if max_cusips is None or len(chunks[k]) < max_cusips:
+                heapq.heappush(heap, (loads[k], k))
+            if not heap:
+                break
+        placed = sum(len(c) for c in chunks)
+        if placed == len(small) and max(loads) <= max_rows:
+            break
+        n_chunks += 1
+
+    chunks = [[c] for c in big.index] + [c for c in chunks if c]
+    return [sorted(c, key=order.get) for c in chunks]
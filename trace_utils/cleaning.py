@@ -0,0 +1,352 @@
+'''
+Overview
+-------------
+Dick-Nielsen (2009, 2014) cleaning of one chunk of raw Enhanced TRACE
+trades, followed by the aggregation to the daily bond-level panel. This is
+the per-chunk body of "MakeIntra_Daily_v2.py", moved here so that chunks
+can be cleaned by a pool of workers (see pipeline.py).
+
+The cleaning handles Cancellation, Correction, Reversal and Double entries
+both pre and post the 2012/02/06 change in the TRACE system.
+'''
+
+import pandas as pd
+import numpy as np
+
+from trace_utils.filters import PRE2012_FILTERS, trade_mask_counts
+from trace_utils.antijoin import anti_join_mask
+from trace_utils.corrections import resolve_w_chains
+from trace_utils.reversals import reversal_drop_mask
+from trace_utils.daily import daily_aggregates, DAILY_COLUMNS
+from trace_utils.tape import write_tape
+from trace_utils.interdealer import interdealer_drop_mask
+from trace_utils.audit import ChunkAudit, chunk_id, write_audit
+
+
+def clean_chunk(trace, filters=PRE2012_FILTERS, columns=DAILY_COLUMNS,
+                tape=None, dedupe_dealers=False, audit=None, min_rows=100):
+    '''
+    trace   : raw TRACE rows for one chunk of CUSIPs, as returned by
+              source.fetch(...), or by fetch_counted(source, ...) of
+              trace_utils/source.py, whose attrs['fetch'] holds the record
+              count before the filters pushed down to the source, the
+              records they removed and the time of the fetch
+    filters : trade-level filters (trace_utils/filters.py) applied before
+              the Dick-Nielsen steps
+    columns : daily frames and their columns (trace_utils/daily.py)
+    tape    : folder of the cleaned trade tape (trace_utils/tape.py) the
+              trades of the chunk are written to, or None
+    dedupe_dealers : keep one leg of the inter-dealer trades reported by
+              both dealers (trace_utils/interdealer.py)
+    audit   : JSON Lines log the audit record of the chunk (rows removed
+              by each rule, time and peak RSS of each stage; see
+              trace_utils/audit.py) is appended to, or None
+    min_rows : chunks with at most this many raw rows (before any
+              filter) are not cleaned
+
+    Returns (daily, stats). daily is a dict of frames indexed by
+    (cusip_id, trd_exctn_dt), by default 'Prices', 'Volumes' and 'Illiq',
+    or None if the chunk has too few observations. stats holds the
+    CleaningExport row.
+    '''
+    log   = ChunkAudit()
+    fetch = trace.attrs.get('fetch', {})
+    if 'seconds' in fetch:
+        # Fetch stage, with the records of the pushed-down filters
+        log.add_stage('fetch', fetch['seconds'], fetch['peak_rss_mb'],
+                      **fetch['removed'])
+    ids = trace['cusip_id'].unique() if 'cusip_id' in trace else []
+    with pd.option_context('mode.chained_assignment', None):
+        daily, stats = _clean_chunk(trace, filters, columns, tape,
+                                    dedupe_dealers, log, min_rows)
+    if audit is not None:
+        write_audit(audit, log.record(chunk     = chunk_id(ids),
+                                      n_cusips  = len(ids),
+                                      **stats))
+    return daily, stats
+
+
+def _clean_chunk(trace, filters, columns, tape, dedupe_dealers, log,
+                 min_rows):
+    # Raw records of the chunk, counted at the source when the filters
+    # were pushed down (fetch_counted in trace_utils/source.py)
+    n_raw = trace.attrs.get('fetch', {}).get('rows', len(trace))
+    stats = {'Obs.Pre': int(n_raw)}
+    
+    #### Basically try-catch --> ensure >min_rows obs in the pulled data, 
+    #### handles edge cases where there is not any data     
+    if n_raw <= min_rows or len(trace) == 0:
+        # Skipped, or nothing left after the pushed-down filters
+        n_left = n_raw if n_raw <= min_rows else 0
+        stats['Obs.PostBBW'] = int(n_left)
+        stats['Obs.PostDickNielsen'] = int(n_left)
+        stats['Obs.DealerLegsRemoved'] = 0
+        return None, stats
+    else:
+        
+        # Convert dates to datetime        
+        trace['trd_exctn_dt']         = pd.to_datetime(trace['trd_exctn_dt'], format = '%Y-%m-%d')
+        trace['trd_rpt_dt']           = pd.to_datetime(trace['trd_rpt_dt'],   format = '%Y-%m-%d')         
+               
+        #* ************************************ */
+        #* 0.0 Trade-level filters              */
+        #* ************************************ */
+        # Volume filter, plus the van Binsbergen, Nozawa and Schwert 
+        # restrictions (see trace_utils/filters.py). When the filters are 
+        # pushed down to the source this only re-checks the fetched rows;
+        # the records they removed are counted in the fetch stage.
+        _keep, _removed = trade_mask_counts(trace, filters)
+        trace = trace[_keep]
+                        
+        stats['Obs.PostBBW'] = int(len(trace))
+        log.mark('filters', **_removed)                                                                                          
+    
+        #* ************************************ */
+        #* 1.0 Parsing out Post 2012/02/06 Data */
+        #* ************************************ */              
+        post= trace[(trace['cusip_id'] != '') & (trace['trd_rpt_dt'] >="2012-02-06")]
+        pre = trace[(trace['cusip_id'] != '') & (trace['trd_rpt_dt'] < "2012-02-06")]   
+        
+        #* ************************************** */
+        #* 1.1 Remove Cancellation and Correction */
+        #* ************************************** */        
+        
+        # * Match Cancellation and Correction using following 7 keys:
+        # * Cusip_id, Execution Date and Time, Quantity, Price, Buy/Sell Indicator, Contra Party
+        # * C and X records show the same MSG_SEQ_NB as the original record;
+                
+        post_tr = post[(post['trc_st'] == 'T') | (post['trc_st'] == 'R')]       
+        post_xc = post[(post['trc_st'] == 'X') | (post['trc_st'] == 'C')]       
+        post_y  = post[(post['trc_st'] == 'Y')]      
+        
+        # Match on the 7 keys plus the message sequence number, without
+        # merging the full trade records (see trace_utils/antijoin.py)
+        post_keys = ['cusip_id',        # 1
+                     'trd_exctn_dt',    # 2
+                     'trd_exctn_tm',    # 3
+                     'rptd_pr',         # 4
+                     'entrd_vol_qt',    # 5
+                     'rpt_side_cd',     # 6
+                     'cntra_mp_id']     # 7
+        
+        clean_post1 = post_tr.drop_duplicates()
+        _n_post     = len(clean_post1)
+        
+        # Remove the matched "Trade Report" observations;
+        clean_post1 = clean_post1[anti_join_mask(clean_post1, post_xc,
+                                                 post_keys + ['msg_seq_nb'])]
+        log.mark('post_cancel_correct',
+                 post_duplicates = len(post_tr) - _n_post,
+                 post_xc         = _n_post - len(clean_post1))
+        
+        #* ******************** */
+        #* 1.2 Remove Reversals */
+        #* ******************** */
+
+        # * Match Reversal using the same 7 keys:
+        # * Cusip_id, Execution Date and Time, Quantity, Price, Buy/Sell Indicator, Contra Party
+        # * R records show ORIG_MSG_SEQ_NB matching orignal record MSG_SEQ_NB;
+        # Earlier versions merged on the Y records but filtered on the
+        # trc_st_y column of step 1.1, so no reversal was removed (see
+        # CHANGELOG.md).
+        clean_post2 = clean_post1[anti_join_mask(clean_post1, post_y,
+                                                 post_keys + ['msg_seq_nb'],
+                                                 post_keys + ['orig_msg_seq_nb'])]
+        log.mark('post_reversals',
+                 post_y = len(clean_post1) - len(clean_post2))
+              
+        #* ********************************* */
+        #* Pre 2012-02-06 Data               */
+        #* ********************************* */
+        
+        # The van Binsbergen, Nozawa, and Schwert restrictions on the
+        # pre-2012 records (when-issued, special conditions, locked-in,
+        # more than two days to settlement) are applied in 0.0 above
+        # via PRE2012_FILTERS.
+                    
+        #* ********************************* */
+        #* 2.1 Remove Cancellation Cases (C) */
+        #* ********************************* */
+        pre_c = pre[pre['trc_st'] == 'C']       
+        pre_w = pre[pre['trc_st'] == 'W']       
+        pre_t = pre[pre['trc_st'] == 'T']        
+        
+        # Match Cancellation by the 7 keys:
+        # Cusip_ID, Execution Date and Time, Quantity, Price, Buy/Sell Indicator, Contra Party
+        # C records show ORIG_MSG_SEQ_NB matching orignal record MSG_SEQ_NB;
+        merged = pd.merge(pre_t.drop_duplicates(), pre_c[[
+                          'cusip_id',
+                          'trd_exctn_dt',
+                          'trd_exctn_tm',
+                          'rptd_pr',
+                          'entrd_vol_qt',
+                          'trd_rpt_dt',
+                          'orig_msg_seq_nb',
+                          'trc_st']],
+                           left_on=[        'cusip_id', 
+                                            'trd_exctn_dt', 
+                                            'trd_exctn_tm', 
+                                            'rptd_pr', 
+                                            'entrd_vol_qt', 
+                                            'trd_rpt_dt', 
+                                            'msg_seq_nb'], # msg
+                                          right_on=['cusip_id', 
+                                            'trd_exctn_dt', 
+                                            'trd_exctn_tm', 
+                                            'rptd_pr', 
+                                            'entrd_vol_qt', 
+                                            'trd_rpt_dt', 
+                                            'orig_msg_seq_nb']  ,  # orig_msg                      
+                        how = "left")
+        
+        
+        merged = merged.drop_duplicates()
+        
+        # Filter out C cases
+        _del_c     = merged[merged['trc_st_y'] == 'C']
+        clean_pre1 = merged[merged['trc_st_y'] != 'C']
+        
+        log.mark('pre_cancel', pre_c = len(_del_c))
+        
+        # Clean-up clean_pre1#
+        clean_pre1.drop(['orig_msg_seq_nb_y', 'trc_st_y'], axis = 1, inplace = True)
+        clean_pre1.rename(columns={'trc_st_x':'trc_st',
+                                   'orig_msg_seq_nb_x':'orig_msg_seq_nb'}, inplace=True) 
+        
+        #* ******************************* */
+        #* 2.2 Remove Correction Cases (W) */
+        #* ******************************* */
+        
+        # * NOTE: on a given day, a bond can have more than one round of correction
+        # * One W to correct an older W, which then corrects the original T
+        # * Before joining back to the T data, first need to clean out the W to
+        # * handle the situation described above;
+        # * The following section handles the chain of W cases;
+        
+        # 2.2.1 - 2.2.6 Follow every chain of W records back to the record it
+        # corrects (see trace_utils/corrections.py). The last W of each chain
+        # is kept, with the orig_msg_seq_nb of the first record of the chain;
+        w_clean = resolve_w_chains(pre_w)
+        
+        # /* 2.2.7 Match up with Trade Record data to delete the matched T record */;
+        # * Matching by Cusip_ID, Date, and MSG_SEQ_NB;
+        # * W records show ORIG_MSG_SEQ_NB matching orignal record MSG_SEQ_NB;
+        clean_pre2 = pd.merge(clean_pre1.drop_duplicates(), w_clean[[
+                                                   'cusip_id', 
+                                                   'trd_exctn_dt', 
+                                                   'msg_seq_nb',
+                                                   'orig_msg_seq_nb',
+                                                   'trc_st' ]], 
+                      left_on  = ['cusip_id', 'trd_exctn_dt', 'msg_seq_nb'], 
+                      right_on = ['cusip_id', 'trd_exctn_dt', 'orig_msg_seq_nb'], 
+                      how = 'left')
+               
+        # Clean-up clean_pre2 #
+        clean_pre2.rename(columns={ 'trc_st_x':'trc_st',
+                                    'trc_st_y':'trc_st_w',
+                                    'msg_seq_nb_x':'msg_seq_nb',
+                                    'msg_seq_nb_y':'mod_msg_seq_nb',
+                                    'orig_msg_seq_nb_x':'orig_msg_seq_nb',
+                                    'orig_msg_seq_nb_y':'mod_orig_msg_seq_nb'}, inplace=True) 
+        
+        _del_w =  clean_pre2[clean_pre2.trc_st_w == "W"]                                                                              
+
+       # * Delete matched T records;
+        _clean_pre2 =  clean_pre2[clean_pre2['trc_st_w'].isnull()]
+                       
+        _clean_pre2 = _clean_pre2.drop(columns = ['trc_st_w', 
+                                                  'mod_msg_seq_nb', 
+                                                  'mod_orig_msg_seq_nb'])
+        
+        # * Replace T records with corresponding W records;
+        # * Filter out W records with valid matching T from the previous step;
+
+        rep_w = pd.merge(w_clean.drop_duplicates(), _del_w[['cusip_id',
+                                                            'trd_exctn_dt',
+                                                            'trc_st_w',
+                                                            'mod_msg_seq_nb',
+                                                            'mod_orig_msg_seq_nb']], 
+                 left_on  = ['cusip_id', 'trd_exctn_dt', 'msg_seq_nb'], 
+                 right_on = ['cusip_id', 'trd_exctn_dt', 'mod_msg_seq_nb'], 
+                how = 'left')
+        
+        
+        rep_w = rep_w[rep_w['trc_st_w'] == 'W']
+        
+        rep_w = rep_w.drop_duplicates(subset = ['cusip_id',
+                                                'trd_exctn_dt',
+                                                'msg_seq_nb',
+                                                'orig_msg_seq_nb',
+                                                'rptd_pr',
+                                                'entrd_vol_qt'])
+        rep_w = rep_w.drop(columns = [            'trc_st_w', 
+                                                  'mod_msg_seq_nb', 
+                                                  'mod_orig_msg_seq_nb'])
+              
+        clean_pre3 = pd.concat([_clean_pre2, rep_w], axis = 0)
+        log.mark('pre_correct', pre_w = len(_del_w))
+        
+        #* ***************** */
+        #* 2.3 Reversal Case */
+        #* ***************** */
+        # * Remove records that are R (reversal) D (Delayed dissemination) and 
+        # X (delayed reversal);
+        _clean_pre4 = clean_pre3[~clean_pre3['asof_cd'].isin(['R', 'X', 'D'])]
+        
+        #* Option B: Match by only 6 keys: CUSIP_ID, 
+        # Execution Date, Vol, Price, B/S and C/D (remove the time dimension),
+        # the k-th reversal matching the k-th trade (see trace_utils/reversals.py);
+        _rev_drop   = reversal_drop_mask(_clean_pre4,
+                                         clean_pre3[clean_pre3['asof_cd'] == 'R'])
+        _clean_pre5 = _clean_pre4[~_rev_drop].drop_duplicates()
+        log.mark('pre_reversals',
+                 pre_asof       = len(clean_pre3) - len(_clean_pre4),
+                 pre_reversals  = _rev_drop.sum(),
+                 pre_duplicates = len(_clean_pre4) - _rev_drop.sum() -
+                                  len(_clean_pre5))
+        
+        # =====================================================================
+        # * Combine the pre and post data together */;
+        clean_post2 = clean_post2[[                    'cusip_id',
+                                                       'trd_exctn_dt',                                                    
+                                                       'rptd_pr',
+                                                       'entrd_vol_qt',
+                                                       'rpt_side_cd',
+                                                       'trd_exctn_tm',
+                                                       'cntra_mp_id',
+                                                       ]]
+        _clean_pre5 = _clean_pre5[clean_post2.columns]
+              
+        trace_post = pd.concat([_clean_pre5, clean_post2], ignore_index=True)
+        
+        stats['Obs.PostDickNielsen'] = int(len(trace_post))
+        
+        #* ************************************ */
+        #* 3.0 Inter-dealer double counts       */
+        #* ************************************ */
+        # Both dealers report an inter-dealer trade: drop the buy leg of 
+        # each pair of legs with the same CUSIP, execution date / time, 
+        # price and quantity (see trace_utils/interdealer.py)
+        _dealer_drop = np.zeros(len(trace_post), dtype=bool)
+        if dedupe_dealers:
+            _dealer_drop = interdealer_drop_mask(trace_post)
+            trace_post   = trace_post[~_dealer_drop]
+        stats['Obs.DealerLegsRemoved'] = int(_dealer_drop.sum())
+        log.mark('dealers', dealer_legs = _dealer_drop.sum())
+        
+        # Keep the cleaned trades for intraday measures
+        if tape is not None:
+            write_tape(trace_post, tape)
+            log.mark('tape')
+    
+        trace = trace_post.set_index(['cusip_id','trd_exctn_dt']).sort_index(level = 'cusip_id') 
+        
+        #* ***************** */
+        #* Prices / Volume   */
+        #* ***************** */
+        # Prices (EW, VW), volumes, trade counts, bid / ask prices and
+        # the intraday bars of `columns` in one pass over the day codes
+        # (see trace_utils/daily.py)
+        daily = daily_aggregates(trace, columns)
+        log.mark('daily')
+        return daily, stats
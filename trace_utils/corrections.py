@@ -0,0 +1,85 @@
+'''
+Overview
+-------------
+Resolver for the pre 2012/02/06 correction chains (step 2.2 of the
+Dick-Nielsen cleaning in cleaning.py). A W record corrects the record
+whose msg_seq_nb equals its orig_msg_seq_nb; on a given day a bond can
+have several rounds of correction, one W correcting an older W which
+corrected the original T:
+
+    T (1)  <-  W (2, orig 1)  <-  W (3, orig 2)
+
+Only the last W of each chain is kept, with orig_msg_seq_nb set to the
+root of the chain (here W 3 with orig 1), so it replaces the T record in
+step 2.2.7.
+
+The W records are sorted once by (cusip_id, trd_exctn_dt, msg_seq_nb);
+each orig_msg_seq_nb is located in the sorted keys with a binary search,
+and the chains are followed by pointer doubling, so a chain of any length
+is resolved in log2(length) vectorized passes. Chains are followed across
+execution times within the day; the former pairwise logic matched records
+with the same trd_exctn_tm only, and kept a single hop when there were
+several chains at one time stamp. Elsewhere the two agree; both cases are
+tested against the former logic in tests/test_corrections.py.
+'''
+
+import numpy as np
+import pandas as pd
+
+W_GROUP = ['cusip_id', 'trd_exctn_dt']
+
+# Columns the resolved records are de-duplicated on, as in step 2.2.6
+W_KEYS  = ['orig_msg_seq_nb', 'cusip_id', 'trd_exctn_dt', 'trd_exctn_tm',
+           'msg_seq_nb']
+
+
+def chain_roots(pre_w, max_passes=32):
+    '''
+    Returns (root, last): for every W record, the position of the first W
+    of its chain (-1 for records on a cycle), and whether no other W of
+    the same bond-day corrects it.
+    '''
+    n   = len(pre_w)
+    grp = pre_w.groupby(W_GROUP, observed=True, sort=False).ngroup()\
+        .to_numpy(dtype=np.int64)
+    seq = pd.factorize(pd.concat([pre_w['msg_seq_nb'],
+                                  pre_w['orig_msg_seq_nb']],
+                                 ignore_index=True))[0].astype(np.int64)
+    width    = seq.max() + 2
+    msg_key  = grp * width + seq[:n]
+    orig_key = np.where(seq[n:] < 0, -1, grp * width + seq[n:])
+
+    # Record corrected by each W (-1 if it is not a W of the same day)
+    order  = np.argsort(msg_key, kind='stable')
+    pos    = np.minimum(np.searchsorted(msg_key[order], orig_key), n - 1)
+    found  = (msg_key[order][pos] == orig_key) & (orig_key >= 0)
+    parent = np.where(found, order[pos], np.arange(n))
+    last   = ~np.isin(msg_key, orig_key[found])
+
+    root = parent
+    for _ in range(max_passes):
+        up = root[root]
+        if (up == root).all():
+            break
+        root = up
+    # Records correcting each other (or themselves) have no root
+    return np.where(found[root], -1, root), last
+
+
+def resolve_w_chains(pre_w):
+    '''
+    The last W record of every correction chain, with orig_msg_seq_nb
+    set to the record the chain corrects (w_clean in cleaning.py).
+    '''
+    if len(pre_w) == 0:
+        return pre_w.copy()
+    root, last = chain_roots(pre_w)
+    keep = last & (root >= 0)
+
+    w_clean = pre_w[keep].copy()
+    w_clean['orig_msg_seq_nb'] = \
+        pre_w['orig_msg_seq_nb'].iloc[root[keep]].values
+    w_clean = w_clean[['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm',
+                       'msg_seq_nb', 'orig_msg_seq_nb'] +
+                      [c for c in pre_w.columns if c not in W_KEYS]]
+    return w_clean.drop_duplicates(subset = W_KEYS)
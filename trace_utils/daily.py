@@ -0,0 +1,197 @@
+'''
+Overview
+-------------
+Daily bond-level aggregation of the cleaned trades of one chunk (the last
+step of cleaning.py). The (cusip_id, trd_exctn_dt) keys are factorized
+once, and every daily quantity is a segment reduction over the day codes
+(np.bincount, or one grouped mean), with no groupby-apply:
+
+    prc_ew       mean rptd_pr
+    prc_vw       sum(rptd_pr * w), w = entrd_vol_qt / sum(entrd_vol_qt)
+    qvolume      sum(entrd_vol_qt)
+    dvolume      sum(round(entrd_vol_qt * rptd_pr / 100))
+    ntrades      number of trades
+    prc_bid      prc_vw of the dealer sells  (rpt_side_cd = 'S')
+    prc_ask      prc_vw of the dealer buys   (rpt_side_cd = 'B')
+
+and, from the trades sorted once by day and execution time,
+
+    prc_first    price of the first trade of the day
+    prc_last     price of the last trade of the day
+    prc_high     highest price
+    prc_low      lowest price
+    tm_last      execution time of the last trade
+    ninterdealer number of inter-dealer trades (cntra_mp_id = 'D')
+    prc_tw       time-weighted price: each price is held until the next
+                 trade, over first to last trade (the mean price if all
+                 the trades of the day share one time stamp)
+
+and the trade-level measures of measures.py (MEASURE_COLUMNS) from the
+same sorted trades.
+
+The column spec maps the name of each daily frame to its columns; only
+the columns listed are computed. A frame with prc_bid or prc_ask only has
+the days with both a bid and an ask. Prices are rounded to 4 decimals and
+dvolume to units. Missing prices and volumes are skipped as np.nansum
+did; a day whose volumes sum to 0 gets a prc_vw of 0.
+'''
+
+import numpy as np
+import pandas as pd
+
+from trace_utils.measures import day_measures, MEASURE_COLUMNS
+
+DAY = ['cusip_id', 'trd_exctn_dt']
+
+# Default daily frames (the Prices, Volumes and Illiq outputs, with the
+# columns of the original scripts; the trade counts are in the Bars)
+DAILY_COLUMNS = {'Prices' : ['prc_ew', 'prc_vw'],
+                 'Volumes': ['qvolume', 'dvolume'],
+                 'Illiq'  : ['prc_bid', 'prc_ask']}
+
+# Intraday bars; need trd_exctn_tm (and cntra_mp_id for ninterdealer)
+BAR_COLUMNS   = ['prc_first', 'prc_high', 'prc_low', 'prc_last', 'tm_last',
+                 'ntrades', 'ninterdealer', 'prc_tw']
+
+_KNOWN = {c for cols in DAILY_COLUMNS.values() for c in cols} | \
+    set(BAR_COLUMNS) | set(MEASURE_COLUMNS)
+
+# Columns that need the trades sorted by execution time
+_TIMED = (set(BAR_COLUMNS) | set(MEASURE_COLUMNS)) - \
+    {'ntrades', 'ninterdealer'}
+
+_ROUND = {'prc_ew': 4, 'prc_vw': 4, 'prc_bid': 4, 'prc_ask': 4,
+          'prc_tw': 4, 'dvolume': 0}
+
+
+def day_codes(trace):
+    '''
+    (codes, days): the day of every trade as an integer code (-1 if a key
+    is missing), and the sorted (cusip_id, trd_exctn_dt) MultiIndex of the
+    codes. `trace` is indexed by DAY.
+    '''
+    c1, u1 = pd.factorize(trace.index.get_level_values(DAY[0]), sort=True)
+    c2, u2 = pd.factorize(trace.index.get_level_values(DAY[1]), sort=True)
+    key    = c1.astype(np.int64) * len(u2) + c2
+    valid  = (c1 >= 0) & (c2 >= 0)
+    uniq, codes = np.unique(key[valid], return_inverse=True)
+    days   = pd.MultiIndex.from_arrays([u1.take(uniq // len(u2)),
+                                        u2.take(uniq %  len(u2))],
+                                       names = DAY)
+    out    = np.full(len(key), -1, dtype=np.int64)
+    out[valid] = codes
+    return out, days
+
+
+def _nansum(codes, values, n):
+    return np.bincount(codes, np.where(np.isnan(values), 0, values), n)
+
+
+def _vwap(codes, prc, vol, n):
+    # nansum(prc * vol / nansum(vol)) per day
+    total = _nansum(codes, vol, n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pw = prc * (vol / total[codes])
+    return _nansum(codes, pw, n)
+
+
+def _seconds(times):
+    '''Seconds after midnight of 'HH:MM:SS' values (NaN if missing).'''
+    codes, uniques = pd.factorize(times)
+    secs = pd.to_timedelta(pd.Index(uniques).astype(str)).total_seconds()
+    return np.r_[secs.to_numpy(dtype=np.float64), np.nan][codes]
+
+
+def _bars(c, p, s, tm, values):
+    # c, p, s, tm: day codes, prices, seconds and times of the trades
+    # sorted by day, then execution time (ties keep their order)
+    start = np.flatnonzero(np.r_[True, c[1:] != c[:-1]])
+    end   = np.r_[start[1:], len(c)] - 1
+
+    values['prc_first'] = p[start]
+    values['prc_last']  = p[end]
+    values['prc_high']  = np.fmax.reduceat(p, start)
+    values['prc_low']   = np.fmin.reduceat(p, start)
+    values['tm_last']   = tm[end]
+
+    # Each price is held until the next trade of the same day
+    held = np.r_[s[1:] - s[:-1], 0.0]
+    held[end] = 0.0
+    held = np.where(np.isnan(held) | np.isnan(p), 0.0, held)
+    span = np.add.reduceat(held, start)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tw = np.add.reduceat(np.where(held > 0, p * held, 0.0),
+                             start) / span
+    values['prc_tw'] = np.where(span > 0, tw,
+                                pd.Series(p).groupby(c).mean().to_numpy())
+
+
+def daily_aggregates(trace, columns=DAILY_COLUMNS):
+    '''
+    trace   : cleaned trades indexed by (cusip_id, trd_exctn_dt), with the
+              rptd_pr, entrd_vol_qt and rpt_side_cd columns (trd_exctn_tm
+              and cntra_mp_id for the bars)
+    columns : dict mapping the name of each daily frame to its columns
+
+    Returns the dict of daily frames, e.g. {'Prices', 'Volumes', 'Illiq'}.
+    '''
+    wanted  = {c for cols in columns.values() for c in cols}
+    unknown = wanted - _KNOWN
+    if unknown:
+        raise ValueError('Unknown daily columns', sorted(unknown))
+    codes, days = day_codes(trace)
+    keep  = codes >= 0
+    codes = codes[keep]
+    n     = len(days)
+    prc   = trace['rptd_pr'].to_numpy(dtype=np.float64)[keep]
+    vol   = trace['entrd_vol_qt'].to_numpy(dtype=np.float64)[keep]
+
+    values = {'ntrades': np.bincount(codes, minlength=n)}
+    if 'prc_ew' in wanted:
+        # Grouped mean over the day codes (compensated sum, as before: the
+        # means of 4 or 8 prices often end on a rounding tie)
+        values['prc_ew'] = pd.Series(prc).groupby(codes).mean().to_numpy()
+    if 'prc_vw' in wanted:
+        values['prc_vw']  = _vwap(codes, prc, vol, n)
+    if 'qvolume' in wanted:
+        values['qvolume'] = _nansum(codes, vol, n)
+    if 'dvolume' in wanted:
+        values['dvolume'] = _nansum(codes, np.round(vol * prc / 100, 0), n)
+
+    # Bid (dealer sells) and ask (dealer buys) prices
+    both = np.ones(n, dtype=bool)
+    if wanted & {'prc_bid', 'prc_ask'}:
+        side = trace['rpt_side_cd'].to_numpy(dtype=object)[keep]
+        for name, cd in [('prc_bid', 'S'), ('prc_ask', 'B')]:
+            rows = side == cd
+            values[name] = _vwap(codes[rows], prc[rows], vol[rows], n)
+            both &= np.bincount(codes[rows], minlength=n) > 0
+
+    if wanted & ({'ninterdealer'} | set(MEASURE_COLUMNS)):
+        dealer = trace['cntra_mp_id'].to_numpy(dtype=object)[keep] == 'D'
+        values['ninterdealer'] = np.bincount(codes, dealer, n)\
+            .astype(np.int64)
+
+    # Trades sorted once by day, then execution time
+    if wanted & _TIMED and n:
+        tm    = trace['trd_exctn_tm'].to_numpy(dtype=object)[keep]
+        secs  = _seconds(tm)
+        order = np.lexsort((secs, codes))
+        c, p, s = codes[order], prc[order], secs[order]
+        _bars(c, p, s, tm[order], values)
+        if wanted & set(MEASURE_COLUMNS):
+            side = trace['rpt_side_cd'].to_numpy(dtype=object)[keep]
+            values.update(day_measures(c, n, p, vol[order], s, side[order],
+                                       dealer[order]))
+
+    for c in wanted - set(values):
+        # No trades in the chunk
+        values[c] = np.empty(0)
+    daily = {}
+    for name, cols in columns.items():
+        rows = both if {'prc_bid', 'prc_ask'} & set(cols) else slice(None)
+        daily[name] = pd.DataFrame({c: np.round(values[c][rows], _ROUND[c])
+                                    if c in _ROUND else values[c][rows]
+                                    for c in cols},
+                                   index = days[rows])
+    return daily
@@ -0,0 +1,210 @@
+'''
+Overview
+-------------
+Year-partitioned Parquet datasets for the daily outputs of
+MakeIntra_Daily_v2.py (Prices, Volumes, Illiq, Bars), used instead of the
+gzip CSVs. DailyParquetWriter appends the frame of each chunk as row
+groups to one open file per year of trd_exctn_dt, so a single chunk is
+held in memory while the output is written. Columns are typed (cusip_id
+string, trd_exctn_dt date, trade counts int64, tm_last string, the rest
+float64) and compressed with zstd.
+
+read_daily loads a dataset back as a frame indexed by (cusip_id,
+trd_exctn_dt), reading only the requested columns, CUSIPs and years.
+upsert_daily is the counterpart of incremental.upsert_csv for the
+weekly updates.
+
+Layout
+-------------
+    <path>/year=<YYYY>/part-0.parquet
+
+The dataset is written under a temporary name and renamed into place when
+the writer is closed; an upsert rewrites each affected year the same way.
+
+Requirements
+-------------
+pyarrow
+'''
+
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+INDEX = ['cusip_id', 'trd_exctn_dt']
+
+# Arrow type of the daily columns (float64 if not listed)
+COLUMN_TYPES = {'cusip_id'    : pa.string(),
+                'trd_exctn_dt': pa.date32(),
+                'ntrades'     : pa.int64(),
+                'ninterdealer': pa.int64(),
+                'n_irt'       : pa.int64(),
+                'n_roll'      : pa.int64(),
+                'tm_last'     : pa.string()}
+
+COMPRESSION = 'zstd'
+
+
+def daily_schema(columns):
+    '''Arrow schema of a daily frame with `columns` (index included).'''
+    return pa.schema([(c, COLUMN_TYPES.get(c, pa.float64()))
+                      for c in INDEX + list(columns)])
+
+
+def to_table(frame):
+    '''Daily frame indexed by INDEX -> Arrow table of daily_schema.'''
+    table = pa.Table.from_pandas(frame.reset_index(), preserve_index=False)
+    return table.cast(daily_schema(frame.columns))
+
+
+def _years(table):
+    dates = table.column('trd_exctn_dt').to_numpy().astype('datetime64[Y]')
+    return dates.astype(np.int64) + 1970
+
+
+def _part(path, year):
+    return os.path.join(path, 'year=%d' % year)
+
+
+class DailyParquetWriter:
+    '''
+    Streams daily frames into a year-partitioned Parquet dataset:
+
+        with DailyParquetWriter('Prices.parquet') as writer:
+            for frame in frames:
+                writer.write(frame)
+
+    Every frame must have the same columns. An existing dataset at `path`
+    is replaced on close.
+    '''
+
+    def __init__(self, path, compression=COMPRESSION):
+        self.path        = path
+        self.compression = compression
+        self.tmp         = path + '.tmp-' + uuid.uuid4().hex
+        self.schema      = None
+        self.writers     = {}
+        os.makedirs(self.tmp)
+
+    def write(self, frame):
+        table = to_table(frame)
+        if self.schema is None:
+            self.schema = table.schema
+        elif table.schema != self.schema:
+            raise ValueError('Daily frame does not match the dataset',
+                             table.schema.names, self.schema.names)
+        years = _years(table)
+        for year in np.unique(years):
+            if year not in self.writers:
+                os.makedirs(_part(self.tmp, year))
+                self.writers[year] = pq.ParquetWriter(
+                    os.path.join(_part(self.tmp, year), 'part-0.parquet'),
+                    self.schema,
+                    compression = self.compression)
+            self.writers[year].write_table(
+                table.take(np.flatnonzero(years == year)))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_daily(path, columns=None, cusips=None, start=None, end=None):
+    '''
+    Reads a daily dataset written by DailyParquetWriter.
+
+    columns    : daily columns to read (all if None)
+    cusips     : CUSIPs to read (all if None)
+    start, end : first and last trd_exctn_dt to read; whole years outside
+                 the range are skipped
+
+    Returns the frame indexed by (cusip_id, trd_exctn_dt), sorted.
+    '''
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    if columns is None:
+        columns = [c for c in dataset.schema.names
+                   if c not in INDEX + ['year']]
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    if cusips is not None:
+        expr = _and(ds.field('cusip_id').isin(pa.array(list(cusips),
+                                                        type=pa.string())))
+    if start is not None:
+        start = pd.Timestamp(start).date()
+        expr  = _and((ds.field('year') >= start.year) &
+                     (ds.field('trd_exctn_dt') >= start))
+    if end is not None:
+        end  = pd.Timestamp(end).date()
+        expr = _and((ds.field('year') <= end.year) &
+                    (ds.field('trd_exctn_dt') <= end))
+
+    table = dataset.to_table(columns=INDEX + list(columns), filter=expr)
+    frame = table.to_pandas(date_as_object=False)
+    frame['trd_exctn_dt'] = frame['trd_exctn_dt'].astype('datetime64[ns]')
+    return frame.set_index(INDEX).sort_index()
+
+
+def upsert_daily(path, frames, days):
+    '''
+    Replaces the rows of `days` in the dataset at `path` by the rows of
+    `frames` (recomputed days without a row are deleted), as
+    incremental.upsert_csv does for a gzip CSV. Only the years with an
+    affected day are rewritten; existing rows are aligned to the columns
+    of the new rows.
+    '''
+    new   = pd.concat(frames) if frames else None
+    years = set(days.get_level_values('trd_exctn_dt').year)
+    if new is not None:
+        years |= set(_years(to_table(new)))
+
+    for year in sorted(years):
+        part = _part(path, year)
+        rows = []
+        if os.path.exists(part):
+            old = read_daily(part)
+            old = old[~old.index.isin(days)]
+            if new is not None:
+                old = old.reindex(columns=new.columns)
+            rows.append(old)
+        if new is not None:
+            rows.append(new[new.index.get_level_values('trd_exctn_dt')
+                            .year == year])
+        if not rows:
+            continue
+        rows = pd.concat(rows).sort_index()
+
+        # Hidden from the dataset readers until it is renamed into place
+        tmp = os.path.join(path, '.tmp-' + uuid.uuid4().hex)
+        os.makedirs(tmp)
+        pq.write_table(to_table(rows), os.path.join(tmp, 'part-0.parquet'),
+                       compression=COMPRESSION)
+        if os.path.exists(part):
+            shutil.rmtree(part)
+        os.replace(tmp, part)
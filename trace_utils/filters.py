@@ -0,0 +1,201 @@
+'''
+Overview
+-------------
+Trade-level filters applied to the raw Enhanced TRACE records before the
+Dick-Nielsen cleaning, kept in one declarative spec. The same spec is
+compiled to
+
+    (1) a SQL WHERE clause      : sql_where(filters)
+    (2) a pyarrow expression    : arrow_expression(filters)
+    (3) an in-memory row mask   : trade_mask(trace, filters), or
+                                  trade_mask_counts(trace, filters) with
+                                  the records removed by each filter
+
+so the rows can be dropped inside the database (they never leave WRDS)
+and the in-memory path cannot drift from the pushed-down one. NULLs are
+handled explicitly (keep_null), so no .astype('str') casts are needed.
+'''
+
+import datetime as dt
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Date of the change in the TRACE reporting system (on trd_rpt_dt)
+POST_2012 = dt.date(2012, 2, 6)
+
+# name      : label used in the cleaning statistics
+# column    : TRACE column the rule is evaluated on
+# op        : 'in', 'not_in', '>=', '>', '<=' or '<'
+# value     : tuple of values for 'in' / 'not_in', a scalar otherwise
+# keep_null : whether rows with a NULL in `column` pass the rule
+# scope     : 'all', or 'pre2012' to only apply the rule to records
+#             reported before 2012/02/06 (later records always pass)
+TradeFilter = namedtuple('TradeFilter',
+                         ['name', 'column', 'op', 'value', 'keep_null',
+                          'scope'])
+
+#* ************************************** */
+#* Filter definitions                     */
+#* ************************************** */
+# Remove trades with > 2-days to settlement #
+# Keep all with days_to_sttl_ct equal to None, 000, 001 or 002
+SETTLEMENT     = TradeFilter('settlement', 'days_to_sttl_ct', 'in',
+                             ('000', '001', '002'), True, 'all')
+# Remove when-issued indicator #
+WHEN_ISSUED    = TradeFilter('wis', 'wis_fl', 'not_in', ('Y',), True, 'all')
+# Remove locked-in indicator #
+LOCKED_IN      = TradeFilter('locked_in', 'lckd_in_ind', 'not_in', ('Y',),
+                             True, 'all')
+# Remove trades with special conditions #
+SALE_CONDITION = TradeFilter('sale_condition', 'sale_cndtn_cd', 'in',
+                             ('@',), True, 'all')
+# Remove trades with volume < $10,000
+VOLUME         = TradeFilter('volume', 'entrd_vol_qt', '>=', 10000, False,
+                             'all')
+# Remove bonds with prices < $5 and > $1,000
+PRICE_MIN      = TradeFilter('price_min', 'rptd_pr', '>', 5, False, 'all')
+PRICE_MAX      = TradeFilter('price_max', 'rptd_pr', '<', 1000, False, 'all')
+
+
+def pre2012(f):
+    return f._replace(scope='pre2012')
+
+
+# MakeIntra_Daily_v2.py / CleanTRACEIntraday.py: volume filter on all
+# trades, the van Binsbergen, Nozawa and Schwert restrictions (settlement,
+# when-issued, locked-in, special conditions) on pre-2012 records only
+PRE2012_FILTERS = (VOLUME,
+                   pre2012(SETTLEMENT),
+                   pre2012(WHEN_ISSUED),
+                   pre2012(LOCKED_IN),
+                   pre2012(SALE_CONDITION))
+
+# trace_intra_day_to_daily_new.py: Bai, Bali and Wen filters on all trades
+BBW_FILTERS = (SETTLEMENT,
+               WHEN_ISSUED,
+               LOCKED_IN,
+               SALE_CONDITION,
+               VOLUME,
+               PRICE_MIN,
+               PRICE_MAX)
+
+
+#* ************************************** */
+#* In-memory                              */
+#* ************************************** */
+def rule_mask(trace, f):
+    '''Boolean Series, True where the record passes filter f.'''
+    col = trace[f.column]
+    if f.op == 'in':
+        mask = col.isin(f.value)
+    elif f.op == 'not_in':
+        mask = ~col.isin(f.value)
+    elif f.op == '>=':
+        mask = col >= f.value
+    elif f.op == '>':
+        mask = col > f.value
+    elif f.op == '<=':
+        mask = col <= f.value
+    elif f.op == '<':
+        mask = col < f.value
+    else:
+        raise ValueError('Invalid filter op', f)
+    null = col.isna()
+    mask = mask | null if f.keep_null else mask & ~null
+    if f.scope == 'pre2012':
+        mask = mask | (pd.to_datetime(trace['trd_rpt_dt']) >=
+                       pd.Timestamp(POST_2012))
+    return mask
+
+
+def trade_mask(trace, filters):
+    '''Boolean Series, True where the record passes every filter.'''
+    mask = pd.Series(True, index=trace.index)
+    for f in filters:
+        mask &= rule_mask(trace, f)
+    return mask
+
+
+def trade_mask_counts(trace, filters):
+    '''
+    Returns (mask, removed): the trade_mask of `filters`, and the number of
+    records removed by each filter. A record is charged to the first filter
+    it fails, so the counts add up to the records removed.
+    '''
+    removed = {f.name: 0 for f in filters}
+    if not filters:
+        return pd.Series(True, index=trace.index), removed
+    passes = np.column_stack([rule_mask(trace, f).to_numpy(dtype=bool)
+                              for f in filters])
+    keep   = passes.all(axis=1)
+    first  = np.bincount(np.argmin(passes[~keep], axis=1),
+                         minlength=len(filters))
+    for f, n in zip(filters, first):
+        removed[f.name] += int(n)
+    return pd.Series(keep, index=trace.index), removed
+
+
+#* ************************************** */
+#* SQL                                    */
+#* ************************************** */
+def _sql_literal(v):
+    if isinstance(v, str):
+        return "'" + v.replace("'", "''") + "'"
+    if isinstance(v, dt.date):
+        return "'" + v.isoformat() + "'"
+    return repr(v)
+
+
+def sql_condition(f):
+    if f.op in ('in', 'not_in'):
+        cond = f.column + (' IN ' if f.op == 'in' else ' NOT IN ') +\
+               '(' + ', '.join(_sql_literal(v) for v in f.value) + ')'
+    elif f.op in ('>=', '>', '<=', '<'):
+        cond = f.column + ' ' + f.op + ' ' + _sql_literal(f.value)
+    else:
+        raise ValueError('Invalid filter op', f)
+    if f.keep_null:
+        cond = '(' + f.column + ' IS NULL OR ' + cond + ')'
+    if f.scope == 'pre2012':
+        cond = '(trd_rpt_dt >= ' + _sql_literal(POST_2012) + ' OR ' +\
+               cond + ')'
+    return cond
+
+
+def sql_where(filters):
+    '''The filters as one SQL condition (without the WHERE keyword).'''
+    return ' AND '.join(sql_condition(f) for f in filters)
+
+
+#* ************************************** */
+#* Arrow (local Parquet mirror)           */
+#* ************************************** */
+def arrow_expression(filters):
+    import pyarrow.dataset as ds
+    expr = None
+    for f in filters:
+        col = ds.field(f.column)
+        if f.op == 'in':
+            cond = col.isin(list(f.value))
+        elif f.op == 'not_in':
+            cond = ~col.isin(list(f.value))
+        elif f.op == '>=':
+            cond = col >= f.value
+        elif f.op == '>':
+            cond = col > f.value
+        elif f.op == '<=':
+            cond = col <= f.value
+        elif f.op == '<':
+            cond = col < f.value
+        else:
+            raise ValueError('Invalid filter op', f)
+        if f.keep_null:
+            cond = col.is_null() | cond
+        else:
+            cond = ~col.is_null() & cond
+        if f.scope == 'pre2012':
+            cond = (ds.field('trd_rpt_dt') >= POST_2012) | cond
+        expr = cond if expr is None else expr & cond
+    return expr
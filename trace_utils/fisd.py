@@ -0,0 +1,198 @@
+'''
+Overview
+-------------
+Local snapshot of the Mergent FISD issue and issuer tables shared by all
+the scripts. Each script used to download fisd.fisd_mergedissue and
+fisd.fisd_mergedissuer in full, each with its own column list. Here one
+superset of the columns is downloaded once, written as Parquet, and every
+script reads the columns it needs from the local copy.
+
+Layout
+-------------
+    <cache>/manifest.json                 schema version and snapshots
+    <cache>/<snapshot>/issue.parquet      fisd.fisd_mergedissue
+    <cache>/<snapshot>/issuer.parquet     fisd.fisd_mergedissuer
+
+Snapshots are named after their download time and the last KEEP of them
+are kept on disk. A snapshot older than the TTL, or written with another
+SCHEMA_VERSION, is refreshed from WRDS on the next load. To refresh or
+list the snapshots on disk, from the repository root:
+
+    python -m trace_utils.fisd --refresh
+    python -m trace_utils.fisd
+
+Requirements
+-------------
+pyarrow
+wrds v3.1.2   (to refresh the snapshot)
+'''
+
+import argparse
+import datetime as dt
+import json
+import os
+import shutil
+
+import pandas as pd
+
+# Bump when the column lists below change: old snapshots are re-downloaded
+SCHEMA_VERSION = 1
+
+ISSUE_COLUMNS  = ['complete_cusip',
+                  'issue_id',
+                  'issuer_id',
+                  'foreign_currency',
+                  'coupon_type',
+                  'coupon',
+                  'convertible',
+                  'asset_backed',
+                  'rule_144a',
+                  'bond_type',
+                  'private_placement',
+                  'interest_frequency',
+                  'dated_date',
+                  'day_count_basis',
+                  'offering_date',
+                  'offering_amt',
+                  'maturity',
+                  'principal_amt']
+
+ISSUER_COLUMNS = ['issuer_id',
+                  'country_domicile',
+                  'sic_code']
+
+TABLES = {'issue' : ('fisd.fisd_mergedissue',  ISSUE_COLUMNS),
+          'issuer': ('fisd.fisd_mergedissuer', ISSUER_COLUMNS)}
+
+FISD_CACHE = os.environ.get('FISD_CACHE',
+                            os.path.join(os.path.dirname(os.path.dirname(
+                                os.path.abspath(__file__))), 'fisd_cache'))
+FISD_TTL_DAYS = 7
+KEEP          = 3
+
+
+#* ************************************** */
+#* Manifest                               */
+#* ************************************** */
+def _manifest(cache):
+    file = os.path.join(cache, 'manifest.json')
+    if not os.path.exists(file):
+        return {'schema_version': SCHEMA_VERSION, 'snapshots': []}
+    with open(file) as f:
+        return json.load(f)
+
+
+def _write_manifest(cache, manifest):
+    file = os.path.join(cache, 'manifest.json')
+    with open(file + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(file + '.tmp', file)
+
+
+def current_snapshot(cache=FISD_CACHE, ttl_days=FISD_TTL_DAYS):
+    '''Name of the newest snapshot, or None if missing, stale or outdated.'''
+    manifest = _manifest(cache)
+    if manifest['schema_version'] != SCHEMA_VERSION or \
+            not manifest['snapshots']:
+        return None
+    snap = manifest['snapshots'][-1]
+    age  = dt.datetime.now() - dt.datetime.fromisoformat(snap['downloaded'])
+    if ttl_days is not None and age > dt.timedelta(days=ttl_days):
+        return None
+    return snap['name']
+
+
+#* ************************************** */
+#* Download                               */
+#* ************************************** */
+def refresh(db=None, cache=FISD_CACHE):
+    '''Downloads a new snapshot from WRDS and returns its name.'''
+    if db is None:
+        import wrds
+        db = wrds.Connection()
+    now  = dt.datetime.now()
+    name = now.strftime('%Y%m%dT%H%M%S')
+    tmp  = os.path.join(cache, '.tmp-' + name)
+    os.makedirs(tmp, exist_ok=True)
+    for key, (table, columns) in TABLES.items():
+        frame = db.raw_sql('SELECT ' + ', '.join(columns) + ' FROM ' + table)
+        frame.to_parquet(os.path.join(tmp, key + '.parquet'), index=False)
+    os.replace(tmp, os.path.join(cache, name))
+
+    manifest = _manifest(cache)
+    if manifest['schema_version'] != SCHEMA_VERSION:
+        manifest = {'schema_version': SCHEMA_VERSION, 'snapshots': []}
+    manifest['snapshots'].append({'name'      : name,
+                                  'downloaded': now.isoformat()})
+    for old in manifest['snapshots'][:-KEEP]:
+        shutil.rmtree(os.path.join(cache, old['name']), ignore_errors=True)
+    manifest['snapshots'] = manifest['snapshots'][-KEEP:]
+    _write_manifest(cache, manifest)
+    return name
+
+
+#* ************************************** */
+#* Load                                   */
+#* ************************************** */
+def _read(cache, snapshot, key, columns):
+    import pyarrow.parquet as pq
+    table = pq.read_table(os.path.join(cache, snapshot, key + '.parquet'),
+                          columns=columns)
+    # Dates come back as datetime.date objects, as from raw_sql
+    return table.to_pandas(date_as_object=True)
+
+
+def load_fisd(db=None, columns=None, cache=FISD_CACHE,
+              ttl_days=FISD_TTL_DAYS, snapshot=None):
+    '''
+    The issue table merged (left) with the issuer table on issuer_id, as
+    the scripts built it from their two raw_sql calls.
+
+    db       : wrds.Connection used if the snapshot has to be refreshed
+    columns  : columns to return, in order (default: all)
+    ttl_days : age after which the snapshot is refreshed (None: never)
+    snapshot : name of an older snapshot to read instead of the newest
+    '''
+    os.makedirs(cache, exist_ok=True)
+    if snapshot is None:
+        snapshot = current_snapshot(cache, ttl_days) or refresh(db, cache)
+
+    columns = list(columns or ISSUE_COLUMNS +
+                   [c for c in ISSUER_COLUMNS if c != 'issuer_id'])
+    unknown = [c for c in columns
+               if c not in ISSUE_COLUMNS and c not in ISSUER_COLUMNS]
+    if unknown:
+        raise ValueError('Columns not in the FISD snapshot', unknown)
+
+    issue  = [c for c in columns if c in ISSUE_COLUMNS]
+    issuer = [c for c in columns if c in ISSUER_COLUMNS and
+              c not in ISSUE_COLUMNS]
+    if not issuer:
+        return _read(cache, snapshot, 'issue', issue)[columns]
+
+    fisd = pd.merge(_read(cache, snapshot, 'issue',
+                          issue + [c for c in ['issuer_id']
+                                   if c not in issue]),
+                    _read(cache, snapshot, 'issuer', ['issuer_id'] + issuer),
+                    on = ['issuer_id'], how = 'left')
+    return fisd[columns]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Local Mergent FISD snapshot (see trace_utils/fisd.py)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='download a new snapshot from WRDS')
+    parser.add_argument('--cache', default=FISD_CACHE)
+    args = parser.parse_args()
+
+    os.makedirs(args.cache, exist_ok=True)
+    if args.refresh:
+        print('Downloaded', refresh(cache=args.cache))
+    manifest = _manifest(args.cache)
+    print('Schema version:', manifest['schema_version'],
+          '(current', str(SCHEMA_VERSION) + ')')
+    for snap in manifest['snapshots']:
+        print(snap['name'], 'downloaded', snap['downloaded'])
+    if not manifest['snapshots']:
+        print('No snapshot in', args.cache)
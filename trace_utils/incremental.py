@@ -0,0 +1,198 @@
+'''
+Overview
+-------------
+Incremental update of the daily Prices / Volumes / Illiq outputs of
+MakeIntra_Daily_v2.py. Instead of re-cleaning the full 2002-present
+history, an update
+
+    (1) reads the watermark (the newest trd_rpt_dt in TRACE when the last
+        run started),
+    (2) finds the (cusip_id, trd_exctn_dt) days with a record reported
+        on or after watermark - look-back,
+    (3) re-fetches and re-cleans those days in full, and
+    (4) upserts the recomputed daily rows into the existing gzip CSVs
+        (or Parquet datasets).
+
+Every Dick-Nielsen match (cancellations, corrections, reversals, the
+pre-2012 W chains) is keyed on cusip_id and trd_exctn_dt, so cleaning all
+the records of an affected day gives exactly the rows a full run would.
+A late cancellation or reversal is reported with the execution date of
+the trade it refers to, so its day is picked up in (2) however old the
+trade is. The look-back covers records that were loaded into TRACE after
+the previous run with an earlier trd_rpt_dt.
+
+The watermark is taken from the data (report_watermark), not from the
+calendar: Enhanced TRACE on WRDS lags by months, so a run date would
+move past records that are only loaded later.
+'''
+
+import datetime as dt
+import gzip
+import json
+import os
+from functools import partial
+
+import pandas as pd
+
+from trace_utils.pipeline import run_pipeline
+from trace_utils.source import fetch_counted
+from trace_utils.dataset import upsert_daily
+
+INDEX = ['cusip_id', 'trd_exctn_dt']
+
+
+#* ************************************** */
+#* Watermark                              */
+#* ************************************** */
+def read_watermark(path):
+    '''The stored trd_rpt_dt watermark as a date, or None.'''
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return dt.date.fromisoformat(json.load(f)['trd_rpt_dt'])
+
+
+def report_watermark(source, previous=None):
+    '''
+    The watermark of a run: the newest trd_rpt_dt in the source, taken
+    before the run fetches anything (records loaded during the run are
+    re-read by the next update), and never before the `previous` one.
+    '''
+    latest = source.max_report_date()
+    if latest is None or (previous is not None and latest < previous):
+        return previous
+    return latest
+
+
+def write_watermark(path, date):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'trd_rpt_dt': pd.Timestamp(date).date().isoformat()}, f)
+    os.replace(tmp, path)
+
+
+#* ************************************** */
+#* Affected days                          */
+#* ************************************** */
+def affected_days(source, cusips, since, filters=None, batch=5000):
+    '''
+    MultiIndex of the (cusip_id, trd_exctn_dt) days with at least one
+    record reported on or after `since`.
+    '''
+    cusips = list(cusips)
+    days   = [source.fetch(cusips[i:i + batch],
+                           columns  = INDEX,
+                           start    = since,
+                           date_col = 'trd_rpt_dt',
+                           filters  = filters)
+              for i in range(0, len(cusips), batch)]
+    days = pd.concat(days, ignore_index=True) if days else \
+        pd.DataFrame(columns=INDEX)
+    days['trd_exctn_dt'] = pd.to_datetime(days['trd_exctn_dt'])
+    days = days.drop_duplicates().sort_values(INDEX)
+    return pd.MultiIndex.from_frame(days)
+
+
+def refresh_days(source, days, clean, filters=None, batch=500, depth=2):
+    '''
+    Re-cleans the affected days, in batches of `batch` CUSIPs. Each batch
+    fetches every record of its CUSIPs between the first and the last
+    affected execution date; only the affected days are kept from the
+    result.
+
+    Batches are cleaned however few rows they hold (min_rows=0): a week
+    of records for a few thinly traded bonds is a normal update.
+
+    Yields (daily, stats, done) per batch: the daily frames restricted to
+    the affected days (None if no record was left to clean), the
+    CleaningExport row, and the affected days the batch recomputed.
+    '''
+    cusips  = list(days.get_level_values('cusip_id').unique())
+    batches = [cusips[i:i + batch] for i in range(0, len(cusips), batch)]
+    clean   = partial(clean, min_rows=0)
+
+    def fetch(part):
+        dates = days[days.get_level_values('cusip_id').isin(part)]\
+            .get_level_values('trd_exctn_dt')
+        return fetch_counted(source, part, start=dates.min(),
+                             end=dates.max(), filters=filters)
+
+    for i, (daily, stats) in run_pipeline(batches, fetch, clean, depth):
+        done = days[days.get_level_values('cusip_id').isin(batches[i])]
+        if daily is None:
+            # No record left: the days have no daily rows any more
+            yield None, stats, done
+            continue
+        daily = {name: frame[frame.index.isin(done)]
+                 for name, frame in daily.items()}
+        yield daily, stats, done
+
+
+#* ************************************** */
+#* Upsert into the gzip CSV outputs       */
+#* ************************************** */
+def upsert_csv(file, frames, days, chunksize=1_000_000):
+    '''
+    Replaces the rows of `days` in the gzip CSV `file` by the rows of
+    `frames` (recomputed days without a row are deleted). The existing
+    file is streamed in chunks and rewritten atomically; new rows are
+    appended at the end. Existing rows are aligned to the columns of the
+    new rows (a column added since the file was written is left empty).
+    '''
+    tmp     = file + '.tmp'
+    header  = True
+    columns = frames[0].columns if frames else None
+    with gzip.open(tmp, 'wt', newline='') as f:
+        if os.path.exists(file):
+            for old in pd.read_csv(file,
+                                   compression     = 'gzip',
+                                   index_col       = INDEX,
+                                   parse_dates     = ['trd_exctn_dt'],
+                                   float_precision = 'round_trip',
+                                   chunksize       = chunksize):
+                old = old[~old.index.isin(days)]
+                if columns is not None:
+                    old = old.reindex(columns=columns)
+                old.to_csv(f, header=header)
+                header = False
+        for new in frames:
+            new.to_csv(f, header=header)
+            header = False
+    os.replace(tmp, file)
+
+
+def update_daily(source, cusips, since, clean, files, filters=None,
+                 batch=500, depth=2):
+    '''
+    Runs (2) - (4) above.
+
+    files : dict mapping the daily frame names ('Prices', 'Volumes',
+            'Illiq') to their gzip CSV outputs, or to Parquet datasets
+            (trace_utils/dataset.py) for the names ending in '.parquet'
+
+    Returns the CleaningExport frame of the update, one row per batch.
+    '''
+    days = affected_days(source, cusips, since, filters)
+    print('Days to update:', len(days))
+
+    frames = {name: [] for name in files}
+    done   = []
+    stats  = []
+    for daily, s, d in refresh_days(source, days, clean, filters, batch,
+                                    depth):
+        stats.append(s)
+        done.append(d)
+        for name in files:
+            if daily is not None:
+                frames[name].append(daily[name])
+
+    done = days[:0].append(done) if done else days[:0]
+    for name, file in files.items():
+        if file.endswith('.parquet'):
+            upsert_daily(file, frames[name], done)
+        else:
+            upsert_csv(file, frames[name], done)
+    return pd.DataFrame(stats, columns=['Obs.Pre',
+                                        'Obs.PostBBW',
+                                        'Obs.PostDickNielsen',
+                                        'Obs.DealerLegsRemoved'])
@@ -0,0 +1,62 @@
+'''
+Overview
+-------------
+Inter-dealer double counts. Both dealers report an inter-dealer trade
+(cntra_mp_id = 'D'): the selling dealer with rpt_side_cd = 'S' and the
+buying dealer with 'B', so every such trade appears twice in the cleaned
+tape, which inflates the volumes and over-weights inter-dealer prices in
+prc_ew.
+
+A buy leg and a sell leg are the same trade when they share the
+DEALER_KEYS: CUSIP, execution date and time, price and quantity. The
+dealer legs are coded as integers and sorted once by the keys and the
+side; within each key, the k-th buy leg is paired with the k-th sell
+leg, and the paired buy legs are dropped, so one leg of each trade is
+kept. Legs without a counterpart (e.g. when one side was cancelled) and
+legs with a missing key are kept.
+'''
+
+import numpy as np
+import pandas as pd
+
+DEALER_KEYS = ['cusip_id',
+               'trd_exctn_dt',
+               'trd_exctn_tm',
+               'rptd_pr',
+               'entrd_vol_qt']
+
+
+def interdealer_drop_mask(trades):
+    '''
+    Boolean array aligned with `trades` (cleaned trades with the
+    DEALER_KEYS, rpt_side_cd and cntra_mp_id), True for the buy legs of
+    the inter-dealer trades whose sell leg is also in `trades`.
+    '''
+    mask   = np.zeros(len(trades), dtype=bool)
+    dealer = (trades['cntra_mp_id'] == 'D').to_numpy(dtype=bool) & \
+        trades[DEALER_KEYS].notna().all(axis=1).to_numpy()
+    side   = trades['rpt_side_cd'].to_numpy(dtype=object)
+    legs   = np.flatnonzero(dealer & ((side == 'B') | (side == 'S')))
+    if len(legs) == 0:
+        return mask
+
+    # Sort keys: DEALER_KEYS, then buy legs before sell legs
+    sell = side[legs] == 'S'
+    keys = np.column_stack([pd.factorize(trades[c].iloc[legs])[0]
+                            for c in DEALER_KEYS])
+    order = np.lexsort((sell,) + tuple(keys.T[::-1]))
+    keys  = keys[order]
+    sell  = sell[order]
+
+    # Key groups, and the rank of each leg among the legs of its side
+    new   = np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)]
+    grp   = np.cumsum(new) - 1
+    first = new | np.r_[True, sell[1:] != sell[:-1]]
+    start = np.flatnonzero(first)
+    rank  = np.arange(len(keys)) - start[np.cumsum(first) - 1]
+
+    # The k-th buy leg is dropped if the key has at least k sell legs
+    n_sell = np.bincount(grp, sell)
+    drop   = ~sell & (rank < n_sell[grp])
+    mask[legs[order[drop]]] = True
+    return mask
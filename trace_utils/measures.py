@@ -0,0 +1,141 @@
+'''
+Overview
+-------------
+Trade-level illiquidity and transaction-cost measures, computed per
+bond-day from the cleaned trades sorted by execution time (the Measures
+frame of daily.py), and aggregated to months by monthly_measures.
+
+    espread    effective spread, in % of the price: the volume-weighted
+               mean of 2 * Q * (p - m) / m over the customer trades, with
+               Q = +1 when the dealer sells (rpt_side_cd = 'S'), -1 when
+               it buys ('B'), and m the VWAP of the day
+    irc        imputed roundtrip cost, in % (Feldhutter, 2012): trades of
+               the same size at most IRC_WINDOW seconds apart form one
+               imputed roundtrip trade; its cost is (pmax - pmin) / pmax,
+               and irc is the mean over the roundtrips of the day
+    n_irt      number of imputed roundtrip trades with 2 trades or more
+    gamma      -cov(r_t, r_t-1) of the consecutive intraday log returns
+               (in %, trimmed to +-100% as in MakeIlliquidity.py)
+    roll       Roll (1984) measure, 2 * sqrt(gamma) (0 if gamma <= 0)
+    n_roll     number of (r_t, r_t-1) pairs
+    prc_range  intraday range, 100 * (log high - log low)
+
+Every step is a segment reduction over sorted codes: lagged returns and
+roundtrip breaks come from within-group shifts (comparing each trade
+with the previous one of the same day), so no groupby-apply is needed.
+'''
+
+import numpy as np
+import pandas as pd
+
+MEASURE_COLUMNS = ['espread', 'irc', 'n_irt', 'gamma', 'roll', 'n_roll',
+                   'prc_range']
+
+# Largest gap between two trades of the same size in one imputed
+# roundtrip trade, in seconds (None: the whole day)
+IRC_WINDOW = 15 * 60
+
+
+def _segments(codes):
+    # Start of each run of equal codes in a sorted array
+    return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+
+def _roll(gamma):
+    with np.errstate(invalid='ignore'):
+        return np.where(gamma > 0, 2 * np.sqrt(np.abs(gamma)),
+                        np.where(np.isnan(gamma), np.nan, 0.0))
+
+
+def day_measures(codes, n, prc, vol, secs, side, dealer,
+                 window=IRC_WINDOW):
+    '''
+    codes  : day code of every trade, sorted by day and execution time
+    n      : number of days
+    prc    : rptd_pr, vol : entrd_vol_qt, secs : execution time in
+             seconds, side : rpt_side_cd, dealer : True for inter-dealer
+             trades, in the order of `codes`
+
+    Returns a dict with an array of length n for each of MEASURE_COLUMNS.
+    '''
+    out   = {}
+    prev  = np.r_[False, codes[1:] == codes[:-1]]
+    start = _segments(codes)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        #* Effective spread: customer trades against the day VWAP */
+        ok   = ~np.isnan(prc) & ~np.isnan(vol)
+        vwap = np.bincount(codes, np.where(ok, prc * vol, 0), n) / \
+            np.bincount(codes, np.where(ok, vol, 0), n)
+        q    = np.where(side == 'S', 1.0, np.where(side == 'B', -1.0, 0.0))
+        es   = 200 * q * (prc - vwap[codes]) / vwap[codes]
+        w    = np.where(ok & ~dealer & (q != 0) & ~np.isnan(es), vol, 0)
+        out['espread'] = np.bincount(codes, w * np.nan_to_num(es), n) / \
+            np.bincount(codes, w, n)
+
+        #* Imputed roundtrip trades: same day and size, close in time */
+        order = np.lexsort((secs, vol, codes))
+        c, v, s, p = codes[order], vol[order], secs[order], prc[order]
+        gap   = np.r_[np.inf, s[1:] - s[:-1]]
+        brk   = np.r_[True, (c[1:] != c[:-1]) | (v[1:] != v[:-1])]
+        if window is not None:
+            brk |= ~(gap <= window)
+        first = np.flatnonzero(brk)
+        size  = np.diff(np.r_[first, len(c)])
+        pmax  = np.fmax.reduceat(p, first)
+        pmin  = np.fmin.reduceat(p, first)
+        irt   = (size >= 2) & (pmax > 0)
+        day   = c[first][irt]
+        out['n_irt'] = np.bincount(day, minlength=n)
+        out['irc']   = np.bincount(day, 100 * (pmax - pmin)[irt] /
+                                   pmax[irt], n) / out['n_irt']
+
+        #* Intraday Roll: lag-1 autocovariance of the returns */
+        r = np.r_[np.nan, np.diff(np.log(prc))]
+        r[~prev] = np.nan
+        r = 100 * np.clip(r, -1, 1)
+        lag = np.r_[np.nan, r[:-1]]
+        lag[~prev] = np.nan
+        pair = ~np.isnan(r) & ~np.isnan(lag)
+        cp   = codes[pair]
+        k    = np.bincount(cp, minlength=n)
+        mx   = np.bincount(cp, r[pair], n) / k
+        my   = np.bincount(cp, lag[pair], n) / k
+        cov  = np.bincount(cp, (r[pair] - mx[cp]) * (lag[pair] - my[cp]),
+                           n) / (k - 1)
+        out['gamma']  = np.where(k >= 2, -cov, np.nan)
+        out['roll']   = _roll(out['gamma'])
+        out['n_roll'] = k
+
+        #* Intraday price range */
+        out['prc_range'] = 100 * (np.log(np.fmax.reduceat(prc, start)) -
+                                  np.log(np.fmin.reduceat(prc, start)))
+    return out
+
+
+def monthly_measures(daily):
+    '''
+    Monthly measures from the daily Measures frame (indexed by cusip_id
+    and trd_exctn_dt): espread and prc_range are the means over the days,
+    irc the mean over the roundtrips of the month, and gamma the pooled
+    within-day covariance (daily gammas weighted by n_roll - 1).
+
+    Returns a frame indexed by (cusip_id, date), date the month end.
+    '''
+    d = daily.reset_index()
+    d['date'] = d['trd_exctn_dt'] + pd.offsets.MonthEnd(0)
+    wg = np.clip(d['n_roll'] - 1, 0, None)
+    d  = d.assign(irc_sum   = (d['irc'] * d['n_irt']).fillna(0),
+                  gamma_sum = (d['gamma'] * wg).fillna(0),
+                  gamma_df  = wg,
+                  ndays     = 1)
+    g  = d.groupby(['cusip_id', 'date'])
+    m  = g[['irc_sum', 'n_irt', 'gamma_sum', 'gamma_df', 'n_roll',
+            'ndays']].sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m['espread']   = g['espread'].mean()
+        m['irc']       = m['irc_sum'] / m['n_irt']
+        m['gamma']     = m['gamma_sum'] / m['gamma_df']
+        m['roll']      = _roll(m['gamma'].to_numpy())
+        m['prc_range'] = g['prc_range'].mean()
+    return m[MEASURE_COLUMNS + ['ndays']]
@@ -0,0 +1,215 @@
+'''
+Overview
+-------------
+Overlapped fetch / clean loop for the CUSIP chunks. A background thread
+fetches chunk i+1, ..., i+depth from the TRACE source while a pool of
+workers cleans chunk i, so the wall time of a run approaches
+max(fetch, clean) instead of fetch + clean.
+
+The prefetch queue is bounded: the fetch thread blocks once `depth`
+chunks are waiting, so at most depth + n_workers + 1 raw chunks are held
+in memory at any time.
+
+The workers are threads by default. With executor='process' every chunk
+is cleaned in a separate worker process instead, which uses all the cores
+for the Dick-Nielsen steps. A fetched chunk is written once as an Arrow
+IPC file in shared memory (/dev/shm), which the worker memory-maps, and
+the DataFrames of the result come back as Arrow IPC streams rather than
+pickled frames. The attrs of the fetched frame (the raw record counts of
+fetch_counted in source.py) are passed to the worker with the file. Results
+are still yielded in chunk order. Process workers are forked, so they
+need the fork start method (Linux); elsewhere the thread workers are
+used.
+'''
+
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+_DONE = object()
+
+# Where the chunks handed to the process workers are written
+SPILL_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def prefetch(chunks, fetch, depth=2):
+    '''
+    Yields (i, chunk, fetch(chunk)) in chunk order, with fetch running on a
+    background thread at most `depth` chunks ahead of the consumer.
+    Exceptions raised by fetch are re-raised in the consumer.
+    '''
+    q    = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(item):
+        # Block while the queue is full, but give up if the consumer left
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for i, chunk in enumerate(chunks):
+                if not put((i, chunk, fetch(chunk))):
+                    return
+        except BaseException as e:
+            put(e)
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=producer, name='trace-prefetch',
+                              daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+#* ************************************** */
+#* Arrow IPC transport (process workers)  */
+#* ************************************** */
+def _write_ipc(frame, path):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink, \
+            pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_ipc(path):
+    import pyarrow as pa
+    return pa.ipc.open_file(pa.memory_map(path)).read_all().to_pandas()
+
+
+class _ArrowFrame:
+    '''A DataFrame returned by a worker, as an Arrow IPC stream.'''
+
+    def __init__(self, frame):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(frame)
+        sink  = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        self.data = sink.getvalue().to_pybytes()
+
+    def frame(self):
+        import pyarrow as pa
+        return pa.ipc.open_stream(self.data).read_all().to_pandas()
+
+
+def _pack(result):
+    if isinstance(result, pd.DataFrame):
+        return _ArrowFrame(result)
+    if isinstance(result, dict):
+        return {k: _pack(v) for k, v in result.items()}
+    if type(result) in (tuple, list):
+        return type(result)(_pack(v) for v in result)
+    return result
+
+
+def _unpack(result):
+    if isinstance(result, _ArrowFrame):
+        return result.frame()
+    if isinstance(result, dict):
+        return {k: _unpack(v) for k, v in result.items()}
+    if type(result) in (tuple, list):
+        return type(result)(_unpack(v) for v in result)
+    return result
+
+
+def _clean_file(clean, path, attrs):
+    # Runs in the worker process
+    trace = _read_ipc(path)
+    trace.attrs.update(attrs)
+    return _pack(clean(trace))
+
+
+def _run_processes(chunks, fetch, clean, depth, n_workers, spill_dir):
+    tmp = tempfile.mkdtemp(prefix='trace-chunks-', dir=spill_dir)
+    try:
+        with ProcessPoolExecutor(max_workers = n_workers,
+                                 mp_context  = multiprocessing.get_context(
+                                     'fork')) as pool:
+            # Fork all the workers now, before the prefetch thread starts
+            pool.submit(int).result()
+            pending = deque()
+            for i, chunk, trace in prefetch(chunks, fetch, depth):
+                path = os.path.join(tmp, '%d.arrow' % i)
+                _write_ipc(trace, path)
+                pending.append((i, path, pool.submit(_clean_file, clean,
+                                                     path, trace.attrs)))
+                del trace
+                # Backpressure: never more than n_workers chunks in cleaning
+                if len(pending) >= n_workers:
+                    j, path, future = pending.popleft()
+                    result = _unpack(future.result())
+                    os.remove(path)
+                    yield j, result
+            while pending:
+                j, path, future = pending.popleft()
+                result = _unpack(future.result())
+                os.remove(path)
+                yield j, result
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def run_pipeline(chunks, fetch, clean, depth=2, n_workers=1,
+                 executor='thread', spill_dir=SPILL_DIR):
+    '''
+    Yields (i, clean(fetch(chunk))) for every chunk, in chunk order.
+
+    chunks    : list of CUSIP lists
+    fetch     : callable, CUSIP list -> raw TRACE DataFrame
+    clean     : callable, raw TRACE DataFrame -> result (picklable, i.e. a
+                module-level function or a partial of one, for 'process')
+    depth     : number of fetched chunks allowed to wait for a worker
+    n_workers : number of chunks cleaned concurrently
+    executor  : 'thread' or 'process'
+    spill_dir : folder of the Arrow IPC chunk files ('process' only)
+    '''
+    n_workers = max(1, n_workers)
+    if executor not in ('thread', 'process'):
+        raise ValueError('Invalid executor', executor)
+    if executor == 'process' and \
+            'fork' not in multiprocessing.get_all_start_methods():
+        warnings.warn('Process workers need the fork start method, '
+                      'cleaning with threads instead')
+        executor = 'thread'
+    if executor == 'process':
+        yield from _run_processes(chunks, fetch, clean, depth, n_workers,
+                                  spill_dir)
+        return
+
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        pending = deque()
+        for i, chunk, trace in prefetch(chunks, fetch, depth):
+            pending.append((i, pool.submit(clean, trace)))
+            del trace
+            # Backpressure: never more than n_workers chunks in cleaning
+            if len(pending) >= n_workers:
+                j, future = pending.popleft()
+                yield j, future.result()
+        while pending:
+            j, future = pending.popleft()
+            yield j, future.result()
@@ -0,0 +1,86 @@
+'''
+Overview
+-------------
+Reversal matcher for the pre 2012/02/06 records (step 2.3 of the
+Dick-Nielsen cleaning in cleaning.py). A reversal (asof_cd = 'R') cancels
+a trade with the same 6 keys: CUSIP_ID, Execution Date, Vol, Price, B/S
+and C/D (the execution time is not used). When several trades share the
+6 keys, the k-th reversal (by execution and report time) cancels the k-th
+trade (by execution time, report time and msg_seq_nb).
+
+The step used to number both sides with two groupby-cumcounts and merge
+the numbered headers, then merge the result back onto the trades. Here
+the trade and reversal keys are stacked, coded as integers and sorted
+once; group starts and occurrence ranks are read off the sorted rows, and
+the matched trades are returned as a drop mask aligned with the trades.
+'''
+
+import numpy as np
+import pandas as pd
+
+REV_KEYS    = ['cusip_id',
+               'trd_exctn_dt',
+               'entrd_vol_qt',
+               'rptd_pr',
+               'rpt_side_cd',
+               'cntra_mp_id']
+
+# Occurrences are numbered within (6 keys, bond_sym_id) in this order
+REV_ORDER   = ['trd_exctn_tm',
+               'trd_rpt_dt',
+               'trd_rpt_tm',
+               'msg_seq_nb']
+
+
+def _codes(col):
+    '''Integer codes ordered like the values of `col` (missing last).'''
+    codes, uniques = pd.factorize(col, sort=True)
+    return np.where(codes < 0, len(uniques), codes)
+
+
+def reversal_drop_mask(trades, reversals):
+    '''
+    trades    : pre-2012 records without the R, X and D as-of codes
+    reversals : pre-2012 records with asof_cd = 'R'
+
+    Boolean array aligned with `trades`, True for the trades cancelled by
+    a reversal.
+    '''
+    if len(trades) == 0 or len(reversals) == 0:
+        return np.zeros(len(trades), dtype=bool)
+
+    # Sort keys: 6 keys, bond_sym_id, trade / reversal, occurrence order
+    cols = REV_KEYS + ['bond_sym_id'] + REV_ORDER
+    both = pd.concat([trades[cols], reversals[cols]], ignore_index=True)
+    rev  = np.r_[np.zeros(len(trades), dtype=bool),
+                 np.ones(len(reversals), dtype=bool)]
+    keys = np.column_stack([_codes(both[c]) for c in cols[:7]] + [rev] +
+                           [_codes(both[c]) for c in REV_ORDER])
+    order = np.lexsort(keys.T[::-1])
+    keys  = keys[order]
+    rev   = rev[order]
+    n     = len(keys)
+
+    def changes(k):
+        # True where one of the first k sort keys changes
+        return np.r_[True, (keys[1:, :k] != keys[:-1, :k]).any(axis=1)]
+
+    # Occurrence rank within (6 keys, bond_sym_id), trades and reversals
+    # numbered separately
+    g6    = np.cumsum(changes(6))
+    grp   = np.cumsum(changes(8))
+    start = np.flatnonzero(changes(8))
+    rank  = np.arange(n) - start[grp - 1]
+
+    # The k-th trade of the 6 keys is matched by the k-th reversal
+    match = g6 * (n + 1) + rank
+    drop  = ~rev & np.isin(match, match[rev])
+
+    # Identical trade records share one header: as long as one of them is
+    # left unmatched, all of them are kept
+    same  = np.cumsum(changes(keys.shape[1]))
+    drop &= ~np.isin(same, same[~rev & ~drop])
+
+    mask = np.zeros(len(trades), dtype=bool)
+    mask[order[~rev]] = drop[~rev]
+    return mask
@@ -0,0 +1,62 @@
+'''
+Overview
+-------------
+Load schema for the raw Enhanced TRACE frames. raw_sql returns every
+non-numeric column as Python objects (strings, datetime.date, None),
+roughly 850 bytes per row before cleaning. apply_schema converts a
+fetched chunk to compact dtypes:
+
+    (1) CUSIPs, flags, status codes and time stamps : category
+        (dictionary-encoded; categories sort like the strings)
+    (2) msg_seq_nb, orig_msg_seq_nb                 : Int64
+    (3) trd_exctn_dt, trd_rpt_dt                    : datetime64[ns]
+    (4) yld_pt                                      : float32
+
+rptd_pr and entrd_vol_qt stay float64: they feed the rounded daily
+prices and dollar volumes, which must not move. Categorical columns must
+be grouped with observed=True (see cleaning.py).
+'''
+
+import pandas as pd
+
+TRACE_SCHEMA = {'cusip_id'        : 'category',
+                'bond_sym_id'     : 'category',
+                'trd_exctn_dt'    : 'datetime64[ns]',
+                'trd_exctn_tm'    : 'category',
+                'days_to_sttl_ct' : 'category',
+                'lckd_in_ind'     : 'category',
+                'wis_fl'          : 'category',
+                'sale_cndtn_cd'   : 'category',
+                'msg_seq_nb'      : 'Int64',
+                'trc_st'          : 'category',
+                'trd_rpt_dt'      : 'datetime64[ns]',
+                'trd_rpt_tm'      : 'category',
+                'entrd_vol_qt'    : 'float64',
+                'rptd_pr'         : 'float64',
+                'yld_pt'          : 'float32',
+                'asof_cd'         : 'category',
+                'orig_msg_seq_nb' : 'Int64',
+                'rpt_side_cd'     : 'category',
+                'cntra_mp_id'     : 'category'}
+
+
+# Matched against each other, so cast together or not at all
+SEQ_COLUMNS = ['msg_seq_nb', 'orig_msg_seq_nb']
+
+
+def apply_schema(trace, schema=TRACE_SCHEMA):
+    '''Casts the columns of `trace` found in `schema`, in place.'''
+    seq = [c for c in SEQ_COLUMNS if c in trace.columns]
+    try:
+        trace[seq] = trace[seq].apply(pd.to_numeric).astype('Int64')
+    except (ValueError, TypeError):
+        # Non-numeric sequence numbers: leave them as strings
+        pass
+    for col, dtype in schema.items():
+        if col not in trace.columns or col in SEQ_COLUMNS:
+            continue
+        if dtype.startswith('datetime64'):
+            trace[col] = pd.to_datetime(trace[col]).astype(dtype)
+        else:
+            trace[col] = trace[col].astype(dtype)
+    return trace
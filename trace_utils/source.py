@@ -0,0 +1,355 @@
+'''
+Overview
+-------------
+Sources for the raw Enhanced TRACE trade records used by the intraday
+cleaners. Every source exposes the same call,
+
+    source.fetch(cusips, columns=None, start=None, end=None,
+                 date_col='trd_exctn_dt', filters=None)
+
+and returns a DataFrame shaped like the output of
+db.raw_sql('SELECT ... FROM trace.trace_enhanced ...'). The projection and
+the CUSIP / date predicates, plus any trade-level filters from filters.py,
+are pushed down to the storage layer, so only the requested rows and
+columns are read. source.count(cusips) returns the number of trade records
+per CUSIP, used to plan the chunks, and source.max_report_date() the
+newest trd_rpt_dt loaded (the watermark of incremental.py). Sources
+built with typed=True return the compact dtypes of schema.py instead of
+object columns.
+
+The records removed by pushed-down filters never reach the cleaner, so
+source.filter_counts(cusips, filters, ...) counts them at the source, and
+fetch_counted(source, cusips, ...) fetches a chunk with the raw record
+count, the records removed by each filter and the time of the fetch kept
+in trace.attrs['fetch'] (the Obs.Pre and the audit of cleaning.py).
+
+    (1) WRDSTraceSource     : trace.trace_enhanced on the WRDS cloud
+    (2) PostgresTraceSource : a local Postgres copy of trace.trace_enhanced
+    (3) ParquetTraceSource  : a local Parquet mirror, partitioned by year
+
+Requirements
+-------------
+wrds v3.1.2   (WRDSTraceSource)
+sqlalchemy    (PostgresTraceSource)
+pyarrow       (ParquetTraceSource)
+'''
+
+import abc
+import datetime as dt
+import time
+
+import pandas as pd
+
+from trace_utils.filters import sql_where, arrow_expression
+from trace_utils.audit import peak_rss_mb
+from trace_utils.schema import apply_schema
+
+#* ************************************** */
+#* Columns used by the cleaners           */
+#* ************************************** */
+TRACE_COLUMNS = ['cusip_id',
+                 'bond_sym_id',
+                 'trd_exctn_dt',
+                 'trd_exctn_tm',
+                 'days_to_sttl_ct',
+                 'lckd_in_ind',
+                 'wis_fl',
+                 'sale_cndtn_cd',
+                 'msg_seq_nb',
+                 'trc_st',
+                 'trd_rpt_dt',
+                 'trd_rpt_tm',
+                 'entrd_vol_qt',
+                 'rptd_pr',
+                 'yld_pt',
+                 'asof_cd',
+                 'orig_msg_seq_nb',
+                 'rpt_side_cd',
+                 'cntra_mp_id']
+
+DATE_COLUMNS = ['trd_exctn_dt', 'trd_rpt_dt']
+
+
+def _as_date(x):
+    if x is None or pd.isna(x):
+        return None
+    return pd.Timestamp(x).date()
+
+
+def _check_columns(columns, date_col):
+    columns = list(TRACE_COLUMNS if columns is None else columns)
+    unknown = [c for c in columns + [date_col] if c not in TRACE_COLUMNS]
+    if unknown:
+        raise ValueError('Unknown TRACE columns', unknown)
+    return columns
+
+
+#* ************************************** */
+#* SQL sources (WRDS / local Postgres)    */
+#* ************************************** */
+class SQLTraceSource(abc.ABC):
+    '''
+    Builds the same SELECT the scripts used to hard-wire, with the column
+    list and the optional date range added to the statement. Sub-classes
+    only decide how the statement is executed (read_sql).
+    '''
+
+    def __init__(self, table='trace.trace_enhanced', typed=False):
+        self.table = table
+        self.typed = typed
+
+    def build_sql(self, columns, start=None, end=None,
+                  date_col='trd_exctn_dt', filters=None):
+        sql = 'SELECT ' + ', '.join(columns) + ' FROM ' + self.table +\
+              self._where(start, end, date_col)
+        if filters:
+            sql += ' AND ' + sql_where(filters)
+        return sql
+
+    def _where(self, start=None, end=None, date_col='trd_exctn_dt'):
+        where = ' WHERE cusip_id in %(cusip_id)s'
+        if start is not None:
+            where += ' AND ' + date_col + ' >= %(start)s'
+        if end is not None:
+            where += ' AND ' + date_col + ' <= %(end)s'
+        return where
+
+    def _params(self, cusips, start=None, end=None):
+        parm = {'cusip_id': tuple(cusips)}
+        if start is not None:
+            parm['start'] = _as_date(start)
+        if end is not None:
+            parm['end'] = _as_date(end)
+        return parm
+
+    def fetch(self, cusips, columns=None, start=None, end=None,
+              date_col='trd_exctn_dt', filters=None):
+        columns = _check_columns(columns, date_col)
+        sql = self.build_sql(columns, start, end, date_col, filters)
+        trace = self.read_sql(sql, self._params(cusips, start, end))
+        return apply_schema(trace) if self.typed else trace
+
+    def filter_counts(self, cusips, filters, start=None, end=None,
+                      date_col='trd_exctn_dt'):
+        '''
+        Returns (rows, removed): the records of `cusips` in the date range
+        before `filters`, and the records removed by each filter, counted
+        in one query (see _removed_counts).
+        '''
+        passed = ['count(*) AS n_0'] + \
+            ['count(*) FILTER (WHERE ' + sql_where(filters[:k]) + ') AS n_%d'
+             % k for k in range(1, len(filters) + 1)]
+        sql = 'SELECT ' + ', '.join(passed) + ' FROM ' + self.table +\
+              self._where(start, end, date_col)
+        counts = self.read_sql(sql, self._params(cusips, start, end))
+        return _removed_counts(counts.iloc[0].tolist(), filters)
+
+    def count(self, cusips):
+        '''Number of trade records per CUSIP (CUSIPs without trades omitted).'''
+        sql = 'SELECT cusip_id, count(*) AS n_trades FROM ' + self.table +\
+              ' WHERE cusip_id in %(cusip_id)s GROUP BY cusip_id'
+        counts = self.read_sql(sql, {'cusip_id': tuple(cusips)})
+        return counts.set_index('cusip_id')['n_trades'].astype('int64')
+
+    def max_report_date(self):
+        '''Newest trd_rpt_dt in the table, or None if it is empty.'''
+        sql = 'SELECT max(trd_rpt_dt) AS trd_rpt_dt FROM ' + self.table
+        return _as_date(self.read_sql(sql, {})['trd_rpt_dt'].iloc[0])
+
+    @abc.abstractmethod
+    def read_sql(self, sql, params):
+        '''Runs `sql` with the %(name)s parameters `params`; a DataFrame.'''
+
+
+class WRDSTraceSource(SQLTraceSource):
+    def __init__(self, db, table='trace.trace_enhanced', typed=False):
+        super().__init__(table, typed)
+        self.db = db
+
+    def read_sql(self, sql, params):
+        return self.db.raw_sql(sql, params=params)
+
+
+class PostgresTraceSource(SQLTraceSource):
+    '''
+    A local Postgres stand-in for WRDS. `con` is a SQLAlchemy URL, engine
+    or connection using the psycopg2 driver (same %(name)s parameter style
+    as WRDS).
+    '''
+
+    def __init__(self, con, table='trace.trace_enhanced', typed=False):
+        super().__init__(table, typed)
+        if isinstance(con, str):
+            import sqlalchemy as sa
+            con = sa.create_engine(con)
+        self.con = con
+
+    def read_sql(self, sql, params):
+        return pd.read_sql_query(sql, self.con, params=params)
+
+
+#* ************************************** */
+#* Local Parquet mirror                   */
+#* ************************************** */
+class ParquetTraceSource:
+    '''
+    Reads a local Parquet / Arrow mirror of trace.trace_enhanced. The mirror
+    is expected to be hive-partitioned by `year` (of trd_exctn_dt), as
+    written by write_trace_parquet below. Date predicates on trd_exctn_dt
+    also prune whole year partitions.
+    '''
+
+    def __init__(self, path, typed=False):
+        import pyarrow.dataset as ds
+        self.path  = path
+        self.typed = typed
+        self.dataset = ds.dataset(path, format='parquet',
+                                  partitioning='hive')
+
+    def fetch(self, cusips, columns=None, start=None, end=None,
+              date_col='trd_exctn_dt', filters=None):
+        columns = _check_columns(columns, date_col)
+        expr = self._expression(cusips, start, end, date_col)
+        if filters:
+            expr = expr & arrow_expression(filters)
+
+        table = self.dataset.to_table(columns=columns, filter=expr)
+        if self.typed:
+            return apply_schema(table.to_pandas(date_as_object=False))
+        # Dates come back as datetime.date objects, as from raw_sql
+        return table.to_pandas(date_as_object=True)
+
+    def _expression(self, cusips, start=None, end=None,
+                    date_col='trd_exctn_dt'):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        has_year = 'year' in self.dataset.schema.names
+
+        expr = ds.field('cusip_id').isin(pa.array(list(cusips),
+                                                  type=pa.string()))
+        if start is not None:
+            expr = expr & (ds.field(date_col) >= _as_date(start))
+            if has_year and date_col == 'trd_exctn_dt':
+                expr = expr & (ds.field('year') >= _as_date(start).year)
+        if end is not None:
+            expr = expr & (ds.field(date_col) <= _as_date(end))
+            if has_year and date_col == 'trd_exctn_dt':
+                expr = expr & (ds.field('year') <= _as_date(end).year)
+        return expr
+
+    def filter_counts(self, cusips, filters, start=None, end=None,
+                      date_col='trd_exctn_dt'):
+        '''
+        Returns (rows, removed): the records of `cusips` in the date range
+        before `filters`, and the records removed by each filter, from one
+        scan of the filter columns (see _removed_counts).
+        '''
+        columns = sorted({f.column for f in filters} | {'trd_rpt_dt'})
+        table   = self.dataset.to_table(
+            columns=columns,
+            filter=self._expression(cusips, start, end, date_col))
+        passed  = [table.num_rows]
+        for f in filters:
+            table = table.filter(arrow_expression([f]))
+            passed.append(table.num_rows)
+        return _removed_counts(passed, filters)
+
+    def count(self, cusips):
+        '''Number of trade records per CUSIP (CUSIPs without trades omitted).'''
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        expr = ds.field('cusip_id').isin(pa.array(list(cusips),
+                                                  type=pa.string()))
+        table = self.dataset.to_table(columns=['cusip_id'], filter=expr)
+        counts = table.to_pandas()['cusip_id'].value_counts()
+        return counts.rename('n_trades').astype('int64')
+
+    def max_report_date(self):
+        '''Newest trd_rpt_dt in the mirror, or None if it is empty.'''
+        import pyarrow.compute as pc
+        table = self.dataset.to_table(columns=['trd_rpt_dt'])
+        return _as_date(pc.max(table['trd_rpt_dt']).as_py())
+
+
+def _removed_counts(passed, filters):
+    '''
+    (rows, removed) from `passed`, the records passing the first k filters
+    for k = 0, ..., len(filters): a record is charged to the first filter
+    it fails, as in filters.trade_mask_counts.
+    '''
+    removed = {f.name: 0 for f in filters}
+    for f, n0, n1 in zip(filters, passed[:-1], passed[1:]):
+        removed[f.name] += int(n0) - int(n1)
+    return int(passed[0]), removed
+
+
+def fetch_counted(source, cusips, columns=None, start=None, end=None,
+                  date_col='trd_exctn_dt', filters=None):
+    '''
+    source.fetch(...) recording in trace.attrs['fetch'] the records of the
+    chunk before the pushed-down filters ('rows'), the records removed by
+    each of them ('removed', from source.filter_counts), and the wall time
+    ('seconds') and peak RSS ('peak_rss_mb') of the fetch, so the cleaning
+    statistics and audit count the raw records whether or not the filters
+    are pushed down.
+    '''
+    t0 = time.perf_counter()
+    if filters:
+        rows, removed = source.filter_counts(cusips, filters, start, end,
+                                             date_col)
+    trace = source.fetch(cusips, columns, start, end, date_col, filters)
+    if not filters:
+        rows, removed = len(trace), {}
+    trace.attrs['fetch'] = {'rows'       : rows,
+                            'removed'    : removed,
+                            'seconds'    : round(time.perf_counter() - t0, 6),
+                            'peak_rss_mb': peak_rss_mb()}
+    return trace
+
+
+def write_trace_parquet(trace, path):
+    '''
+    Appends raw TRACE rows (e.g. one chunk pulled from WRDS) to a local
+    mirror that ParquetTraceSource can read, partitioned by year of
+    trd_exctn_dt.
+    '''
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    trace = trace.copy()
+    for col in DATE_COLUMNS:
+        if col in trace.columns:
+            trace[col] = pd.to_datetime(trace[col]).dt.date
+    trace['year'] = pd.to_datetime(trace['trd_exctn_dt']).dt.year
+    ds.write_dataset(pa.Table.from_pandas(trace, preserve_index=False),
+                     path,
+                     format='parquet',
+                     partitioning=['year'],
+                     partitioning_flavor='hive',
+                     basename_template='part-' +
+                     dt.datetime.now().strftime('%Y%m%d%H%M%S%f') +
+                     '-{i}.parquet',
+                     existing_data_behavior='overwrite_or_ignore')
+
+
+#* ************************************** */
+#* Factory used by the scripts            */
+#* ************************************** */
+def make_trace_source(kind='wrds', db=None, location=None,
+                      table='trace.trace_enhanced', typed=False):
+    '''
+    kind     : 'wrds', 'postgres' or 'parquet'
+    db       : wrds.Connection (kind == 'wrds')
+    location : SQLAlchemy URL (kind == 'postgres') or
+               path to the mirror (kind == 'parquet')
+    typed    : return the compact load schema of schema.py
+    '''
+    if kind == 'wrds':
+        if db is None:
+            raise ValueError('A wrds.Connection is required for kind="wrds"')
+        return WRDSTraceSource(db, table, typed)
+    elif kind == 'postgres':
+        return PostgresTraceSource(location, table, typed)
+    elif kind == 'parquet':
+        return ParquetTraceSource(location, typed)
+    else:
+        raise ValueError('Invalid TRACE source', kind)
@@ -0,0 +1,127 @@
+'''
+Overview
+-------------
+Cleaned intraday trade tape. With a tape folder set, clean_chunk writes
+the trades left after the Dick-Nielsen steps (trace_post in cleaning.py)
+before aggregating them to days, so a new intraday measure can be
+computed from the tape without pulling and cleaning TRACE again.
+
+The tape is a Parquet dataset partitioned by year of trd_exctn_dt and by
+the first PREFIX_LEN characters of the CUSIP, with typed columns and zstd
+compression. Each chunk writes its own files, sorted by (cusip_id,
+trd_exctn_dt, trd_exctn_tm). The file names are hashed from the CUSIPs of
+the chunk, so re-cleaning a chunk (e.g. after a restart) overwrites its
+files instead of adding the trades twice.
+
+Layout
+-------------
+    <path>/year=<YYYY>/prefix=<P>/part-<hash>-<i>.parquet
+
+Requirements
+-------------
+pyarrow
+'''
+
+import hashlib
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+TAPE_ORDER = ['cusip_id', 'trd_exctn_dt', 'trd_exctn_tm']
+
+TAPE_SCHEMA = pa.schema([('cusip_id'    , pa.string()),
+                         ('trd_exctn_dt', pa.date32()),
+                         ('trd_exctn_tm', pa.string()),
+                         ('rptd_pr'     , pa.float64()),
+                         ('entrd_vol_qt', pa.float64()),
+                         ('rpt_side_cd' , pa.string()),
+                         ('cntra_mp_id' , pa.string())])
+
+# CUSIP characters in the prefix partition (the first one: 36 per year)
+PREFIX_LEN = 1
+
+PARTITIONING = ds.partitioning(pa.schema([('year'  , pa.int32()),
+                                          ('prefix', pa.string())]),
+                               flavor='hive')
+
+
+def _strings(col):
+    # Categorical / object column -> str, missing values kept as None
+    return col.astype(str).where(col.notna(), None)
+
+
+def write_tape(trades, path):
+    '''
+    Writes the cleaned trades of one chunk (columns of TAPE_SCHEMA) to the
+    tape at `path`.
+    '''
+    if len(trades) == 0:
+        return
+    trades = trades[TAPE_SCHEMA.names].sort_values(TAPE_ORDER,
+                                                   kind='stable')
+    cusips = trades['cusip_id'].astype(str)
+    trades = trades.assign(
+        cusip_id     = cusips,
+        trd_exctn_tm = _strings(trades['trd_exctn_tm']),
+        rpt_side_cd  = _strings(trades['rpt_side_cd']),
+        cntra_mp_id  = _strings(trades['cntra_mp_id']),
+        year         = pd.DatetimeIndex(trades['trd_exctn_dt']).year,
+        prefix       = cusips.str[:PREFIX_LEN])
+    schema = pa.schema(list(TAPE_SCHEMA) + list(PARTITIONING.schema))
+    table  = pa.Table.from_pandas(trades, preserve_index=False)\
+        .cast(schema)
+
+    h = hashlib.sha1('\n'.join(sorted(cusips.unique())).encode())
+    ds.write_dataset(table,
+                     path,
+                     format                 = 'parquet',
+                     partitioning           = PARTITIONING,
+                     basename_template      = 'part-' +
+                     h.hexdigest()[:20] + '-{i}.parquet',
+                     file_options           = ds.ParquetFileFormat()
+                     .make_write_options(compression='zstd'),
+                     existing_data_behavior = 'overwrite_or_ignore')
+
+
+def read_tape(path, columns=None, cusips=None, start=None, end=None):
+    '''
+    Reads trades from the tape at `path`.
+
+    columns    : columns to read besides TAPE_ORDER (all if None)
+    cusips     : CUSIPs to read (all if None); only their prefix
+                 partitions are scanned
+    start, end : first and last trd_exctn_dt to read; whole years outside
+                 the range are skipped
+
+    Returns the trades sorted by (cusip_id, trd_exctn_dt, trd_exctn_tm).
+    '''
+    dataset = ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+    if columns is None:
+        columns = [c for c in TAPE_SCHEMA.names if c not in TAPE_ORDER]
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    if cusips is not None:
+        cusips   = [str(c) for c in cusips]
+        prefixes = sorted({c[:PREFIX_LEN] for c in cusips})
+        expr = _and(ds.field('prefix').isin(prefixes) &
+                    ds.field('cusip_id').isin(pa.array(cusips,
+                                                       type=pa.string())))
+    if start is not None:
+        start = pd.Timestamp(start).date()
+        expr  = _and((ds.field('year') >= start.year) &
+                     (ds.field('trd_exctn_dt') >= start))
+    if end is not None:
+        end  = pd.Timestamp(end).date()
+        expr = _and((ds.field('year') <= end.year) &
+                    (ds.field('trd_exctn_dt') <= end))
+
+    table = dataset.to_table(columns=TAPE_ORDER + list(columns),
+                             filter=expr)
+    trades = table.to_pandas(date_as_object=False)
+    trades['trd_exctn_dt'] = trades['trd_exctn_dt'].astype('datetime64[ns]')
+    return trades.sort_values(TAPE_ORDER, kind='stable')\
+        .reset_index(drop=True)
@@ -0,0 +1,133 @@
+'''
+Overview
+-------------
+Bai, Bali and Wen (BBW) bond-universe filters on the Mergent FISD issue
+table, kept in one declarative spec. The scripts used to apply them as a
+chain of fisd = fisd[...] statements (one filtered copy per rule, and ~30
+chained bond_type comparisons). bbw_universe evaluates every rule once on
+the full table, keeps the bonds that pass all of them in a single
+selection, and counts the bonds rejected by each rule.
+
+Rejection counts follow the order of the rules: a bond is charged to the
+first rule it fails, so the counts add up to the bonds removed, as in the
+original chain of filters.
+
+Missing values are treated as the original comparisons did: a NaN fails
+'==' and 'in', and passes '!=' and 'not_in'.
+'''
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# name   : label used in the rejection counts
+# column : FISD column the rule is evaluated on
+# op     : '==', '!=', 'in', 'not_in' or 'notnull'
+# value  : scalar for '==' / '!=', tuple for 'in' / 'not_in'
+BondRule = namedtuple('BondRule', ['name', 'column', 'op', 'value'])
+
+# Agency bonds, Muni Bonds, Government Bonds, and Agency backed bonds
+EXCLUDED_BOND_TYPES = ('TXMU', 'CCOV', 'CPAS', 'MBS', 'FGOV', 'USTC',
+                       'USBD', 'USNT', 'USSP', 'USSI', 'FGS', 'USBL',
+                       'ABS', 'O30Y', 'O10Y', 'O3Y', 'O5Y', 'O4W', 'CCUR',
+                       'O13W', 'O52W', 'O26W',
+                       # Agency backed / Agency bonds
+                       'ADEB', 'AMTN', 'ASPZ', 'EMTN', 'ADNT', 'ARNT')
+
+#* ************************************** */
+#* Rule definitions                       */
+#* ************************************** */
+#1: Discard all non-US Bonds (i) in BBW
+US_DOMICILE       = BondRule('us_domicile', 'country_domicile', '==', 'USA')
+#2.1: US FX
+US_CURRENCY       = BondRule('us_currency', 'foreign_currency', '==', 'N')
+#3: Must have a fixed coupon
+FIXED_COUPON      = BondRule('fixed_coupon', 'coupon_type', '!=', 'V')
+#4: Discard ALL convertible bonds
+CONVERTIBLE       = BondRule('convertible', 'convertible', '==', 'N')
+#5: Discard all asset-backed bonds
+ASSET_BACKED      = BondRule('asset_backed', 'asset_backed', '==', 'N')
+#6: Discard all bonds under Rule 144A
+RULE_144A         = BondRule('rule_144a', 'rule_144a', '==', 'N')
+#7: Remove Agency bonds, Muni Bonds, Government Bonds
+BOND_TYPE         = BondRule('bond_type', 'bond_type', 'not_in',
+                             EXCLUDED_BOND_TYPES)
+#8: No Private Placement
+PRIVATE_PLACEMENT = BondRule('private_placement', 'private_placement', '==',
+                             'N')
+#9: Remove floating-rate, bi-monthly and unclassified coupons
+#   -1, 15, 16: unclassified by Mergent, 13: variable coupon, 14: bi-monthly
+INTEREST_FREQUENCY = BondRule('interest_frequency', 'interest_frequency',
+                              'not_in', (-1, 13, 14, 16, 15))
+VARIABLE_COUPON    = BondRule('interest_frequency', 'interest_frequency',
+                              'not_in', (13,))
+#10 Remove bonds lacking information for accrued interest (and hence returns)
+ACCRUED_INFO = tuple(BondRule('has_' + c, c, 'notnull', None)
+                     for c in ['dated_date',
+                               'interest_frequency',
+                               'day_count_basis',
+                               'offering_date',
+                               'coupon_type',
+                               'coupon'])
+
+BBW_CORE_RULES = (US_DOMICILE,
+                  US_CURRENCY,
+                  FIXED_COUPON,
+                  CONVERTIBLE,
+                  ASSET_BACKED,
+                  RULE_144A,
+                  BOND_TYPE,
+                  PRIVATE_PLACEMENT)
+
+# Intraday cleaners (MakeIntra_Daily_v2.py, CleanTRACEIntraday.py, ...)
+BBW_RULES = BBW_CORE_RULES + (INTEREST_FREQUENCY,) + ACCRUED_INFO
+
+# Bond metrics and database scripts: only variable coupons on rule 9, and
+# no rule 10
+BBW_METRICS_RULES = BBW_CORE_RULES + (VARIABLE_COUPON,)
+
+
+#* ************************************** */
+#* Evaluation                             */
+#* ************************************** */
+def bond_mask(fisd, rule):
+    '''Boolean array, True where the bond passes `rule`.'''
+    col = fisd[rule.column]
+    if rule.op == '==':
+        mask = col == rule.value
+    elif rule.op == '!=':
+        mask = col != rule.value
+    elif rule.op == 'in':
+        mask = col.isin(rule.value)
+    elif rule.op == 'not_in':
+        mask = ~col.isin(rule.value)
+    elif rule.op == 'notnull':
+        mask = col.notnull()
+    else:
+        raise ValueError('Invalid rule op', rule)
+    return mask.to_numpy(dtype=bool)
+
+
+def universe_mask(fisd, rules=BBW_RULES):
+    '''
+    Returns (keep, rejected): a boolean array of the bonds passing every
+    rule, and a Series with the number of bonds charged to each rule.
+    '''
+    passes = np.column_stack([bond_mask(fisd, r) for r in rules])
+    keep   = passes.all(axis=1)
+    # First failed rule of every rejected bond
+    first  = np.argmin(passes[~keep], axis=1)
+    counts = np.bincount(first, minlength=len(rules))
+    rejected = pd.Series(counts, index=[r.name for r in rules],
+                         name='rejected')
+    return keep, rejected
+
+
+def bbw_universe(fisd, rules=BBW_RULES):
+    '''
+    Returns (fisd, rejected): the bonds of the universe, and the number of
+    bonds removed by each rule.
+    '''
+    keep, rejected = universe_mask(fisd, rules)
+    return fisd[keep], rejected
@@ -0,0 +1,121 @@
+'''
+Overview
+-------------
+Batched yield to maturity, dirty price, modified duration and convexity
+of many bond-days at once, from the padded cash-flow matrices of
+cashflows.future_cashflows (times in years from settlement and amounts
+per 100 of face value, one row per bond-day).
+
+Prices use QuantLib's conventions for Compounded yields at frequency N:
+each cash flow c paid at time t is discounted by (1 + y / N) ** (-N * t),
+and
+
+    prfull    = sum c * B
+    mod_dur   = sum c * B * t / (1 + y / N) / prfull
+    convexity = sum c * B * t * (N * t + 1) / (N * (1 + y / N) ** 2) / prfull
+
+solve_yields finds the yield matching the dirty prices of all the rows
+together: Newton steps, with a bisection step whenever Newton leaves the
+current bracket [lo, hi] of the root, until the yields move by less than
+TOLERANCE. The duration and convexity come from the same sums as the last
+price. Rows that do not converge within MAX_ITERATIONS, or whose root is
+outside (LOWER_BOUND * N, UPPER_BOUND), are flagged so the caller can fall
+back to QuantLib: QuantLib's own bracket search fails on some of the
+deeply negative yields (a bond far above par close to maturity) and
+reports them as missing.
+
+QuantLib stops its solver at an accuracy of 1e-8 in the yield, so the
+yields agree with QuantLib's bondYield to within 1e-8 (3e-12 on a random
+sample of 45,000 bond-days), and the dirty prices (per 100), duration and
+convexity with QuantLib's at the same yield to within 1e-12 relative
+(3e-14 on the sample). tests/test_bonds.py checks these bounds against
+bond_vars(..., engine='quantlib'), with and without true_yield.
+'''
+
+import numpy as np
+
+# Yield accuracy and iterations of the solver
+TOLERANCE      = 1e-12
+MAX_ITERATIONS = 100
+GUESS          = 0.05
+
+# Yields accepted (times N for the lower bound); the solver itself searches
+# above -N, where 1 + y / N = 0, and below ten times the upper bound
+LOWER_BOUND = -0.3
+UPPER_BOUND = 1000.0
+_FLOOR      = -0.999
+_CEILING    = 10 * UPPER_BOUND
+
+
+def _sums(times, amounts, y, freq):
+    # sum c B, sum c B t, sum c B t (N t + 1), with B the discount factors
+    y    = y[:, None]
+    freq = freq[:, None]
+    with np.errstate(over='ignore', invalid='ignore'):
+        B   = 1.0 / np.power(1.0 + y / freq, freq * times)
+        cB  = amounts * B
+        P   = cB.sum(axis=1)
+        PT  = (cB * times).sum(axis=1)
+        PTT = (cB * times * (freq * times + 1)).sum(axis=1)
+    return P, PT, PTT
+
+
+def yield_analytics(times, amounts, y, freq):
+    '''
+    Dirty price (per 100), modified duration and convexity of each row at
+    yields `y`, compounded `freq` times a year.
+
+    Returns (prfull, mod_dur, convexity).
+    '''
+    y    = np.asarray(y, dtype=float)
+    freq = np.broadcast_to(np.asarray(freq, dtype=float), y.shape)
+    P, PT, PTT = _sums(times, amounts, y, freq)
+    g = 1.0 + y / freq
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return P, PT / g / P, PTT / (freq * g * g) / P
+
+
+def solve_yields(times, amounts, dirty, freq=2):
+    '''
+    times, amounts : padded cash-flow matrices (cashflows.future_cashflows)
+    dirty          : dirty price of each row, per 100 of face value
+    freq           : compounding frequency of the yields (2: semiannual)
+
+    Returns (ytm, prfull, mod_dur, convexity, converged).
+    '''
+    dirty = np.asarray(dirty, dtype=float)
+    n     = len(dirty)
+    freq  = np.broadcast_to(np.asarray(freq, dtype=float), (n,))
+    lo    = _FLOOR * freq
+    hi    = np.full(n, _CEILING)
+    y     = np.full(n, GUESS)
+    done  = ~np.isfinite(dirty) | (amounts.sum(axis=1) <= 0) if n else \
+        np.zeros(0, dtype=bool)
+    bad   = done.copy()
+
+    for _ in range(MAX_ITERATIONS):
+        act = np.flatnonzero(~done)
+        if len(act) == 0:
+            break
+        ya = y[act]
+        P, PT, _ = _sums(times[act], amounts[act], ya, freq[act])
+        f  = P - dirty[act]
+        dP = -PT / (1.0 + ya / freq[act])
+
+        # The price falls with the yield: keep the root bracketed
+        lo[act] = np.where(f > 0, ya, lo[act])
+        hi[act] = np.where(f < 0, ya, hi[act])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new = ya - f / dP
+        out = ~np.isfinite(new) | (new <= lo[act]) | (new >= hi[act])
+        new = np.where(out, 0.5 * (lo[act] + hi[act]), new)
+
+        y[act] = new
+        done[act] = (np.abs(new - ya) < TOLERANCE * (1.0 + np.abs(ya))) | \
+            (f == 0)
+
+    # Roots not reached, or outside the accepted yields
+    converged = done & ~bad & (y > LOWER_BOUND * freq) & (y < UPPER_BOUND)
+    y = np.where(converged, y, np.nan)
+    prfull, dur, conv = yield_analytics(times, amounts, y, freq)
+    return y, prfull, dur, conv, converged